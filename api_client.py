@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import httpx
+from governor import Governor, estimate_tokens, is_retryable
+from metrics import ConnectionTrace, UPSTREAM_REQUESTS, UPSTREAM_ERRORS, TOKENS, record_span
+
+# Messages API endpoint and credentials
+ANTHROPIC_API_URL = os.getenv("ANTHROPIC_API_URL", "https://api.anthropic.com/v1/messages")
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
+ANTHROPIC_VERSION = "2023-06-01"
+
+# Connection pool settings, shared by every Streamlit session in the process
+MAX_CONNECTIONS = int(os.getenv("ANTHROPIC_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("ANTHROPIC_KEEPALIVE_EXPIRY", "120"))
+CONNECT_TIMEOUT = float(os.getenv("ANTHROPIC_CONNECT_TIMEOUT", "10"))
+HTTP2_ENABLED = os.getenv("ANTHROPIC_HTTP2", "1") != "0"
+
+
+def build_headers():
+    """Headers required by every Messages API call"""
+    return {
+        "x-api-key": ANTHROPIC_API_KEY,
+        "content-type": "application/json",
+        "anthropic-version": ANTHROPIC_VERSION
+    }
+
+
+def record_response(status_code, mode):
+    """Count one Messages API response by status"""
+    UPSTREAM_REQUESTS.inc(status=str(status_code), mode=mode)
+    if status_code != 200:
+        UPSTREAM_ERRORS.inc(status=str(status_code))
+
+
+def record_usage(usage):
+    """Add a response's reported token usage to the token counters"""
+    for kind in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"):
+        if usage.get(kind):
+            TOKENS.inc(usage[kind], kind=kind[:-len("_tokens")])
+
+
+def _http2_available():
+    """HTTP/2 needs the optional h2 package (installed with httpx[http2])"""
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ClientManager:
+    """Process-wide pooled AsyncClient running on one long-lived event loop.
+
+    httpx connection pools are bound to the event loop that opened them, so a
+    shared client cannot be used from a fresh ``asyncio.run`` per request.
+    Instead every coroutine that talks to the API is scheduled onto the
+    manager's background loop with ``run`` or ``submit``.
+    """
+
+    def __init__(self, api_url=ANTHROPIC_API_URL):
+        self.api_url = api_url
+        self.http2 = _http2_available()
+        self.limits = httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        )
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever,
+            name="anthropic-client-loop",
+            daemon=True
+        )
+        self._thread.start()
+        self.client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=self.limits,
+            timeout=httpx.Timeout(60.0, connect=CONNECT_TIMEOUT)
+        )
+        self.governor = Governor()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the client loop and return a concurrent future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the client loop and block until it finishes"""
+        return self.submit(coro).result(timeout)
+
+    async def post_messages(self, data, timeout):
+        """POST a request body to the Messages API over the shared pool.
+
+        Waits for the governor's concurrency slot and rate budgets, and
+        retries throttled (429) or overloaded (529) responses with backoff.
+        """
+        estimate = estimate_tokens(data)
+        for attempt in range(self.governor.max_retries + 1):
+            queued = time.perf_counter()
+            async with self.governor.slot(estimate) as reservation:
+                record_span("queue_wait", time.perf_counter() - queued)
+                try:
+                    response = await self.client.post(
+                        self.api_url,
+                        json=data,
+                        headers=build_headers(),
+                        timeout=timeout,
+                        extensions={"trace": ConnectionTrace()}
+                    )
+                except httpx.HTTPError as e:
+                    UPSTREAM_ERRORS.inc(status=type(e).__name__)
+                    raise
+                record_response(response.status_code, "request")
+                if response.status_code == 200:
+                    usage = response.json().get("usage", {})
+                    record_usage(usage)
+                    reservation.tokens = usage.get("input_tokens", 0) + usage.get("output_tokens", 0) or estimate
+                else:
+                    # Rejected requests still count towards RPM but used no tokens
+                    reservation.tokens = 0
+            # Successful bodies are scene content and are never scanned for error markers
+            if response.status_code == 200 or not is_retryable(response.status_code, response.text):
+                return response
+            if attempt == self.governor.max_retries:
+                self.governor.exhausted += 1
+                return response
+            await asyncio.sleep(self.governor.backoff(attempt, response.headers.get("retry-after")))
+
+    async def stream_messages(self, data, timeout):
+        """Stream a Messages API request as (event_type, payload) pairs.
+
+        A non-200 response yields a single ``("http_error", {...})`` pair with
+        the status code and body, after throttled or overloaded responses
+        have been retried like ``post_messages`` does. An overloaded
+        ``error`` event in the middle of a stream is retried the same way;
+        a ``("restart", {})`` pair then tells the consumer to discard what
+        it received from the failed attempt. Closing the generator
+        early (for example with ``contextlib.aclosing``) closes the
+        response, which stops the upstream generation instead of paying for
+        the remaining tokens.
+        """
+        body = dict(data, stream=True)
+        estimate = estimate_tokens(data)
+        for attempt in range(self.governor.max_retries + 1):
+            queued = time.perf_counter()
+            async with self.governor.slot(estimate) as reservation:
+                record_span("queue_wait", time.perf_counter() - queued)
+                try:
+                    async with self.client.stream(
+                        "POST",
+                        self.api_url,
+                        json=body,
+                        headers=build_headers(),
+                        timeout=timeout,
+                        extensions={"trace": ConnectionTrace()}
+                    ) as response:
+                        record_response(response.status_code, "stream")
+                        if response.status_code != 200:
+                            await response.aread()
+                            reservation.tokens = 0
+                            error = {"status_code": response.status_code, "text": response.text}
+                            retry_after = response.headers.get("retry-after")
+                        else:
+                            usage = {}
+                            event_type = None
+                            overloaded = False
+                            final_usage = False
+                            streamed_chars = 0
+                            try:
+                                async for line in response.aiter_lines():
+                                    if line.startswith("event:"):
+                                        event_type = line[6:].strip()
+                                    elif line.startswith("data:"):
+                                        payload = json.loads(line[5:].strip())
+                                        event_type = event_type or payload.get("type")
+                                        if event_type == "message_start":
+                                            usage.update(payload["message"].get("usage", {}))
+                                        elif event_type == "message_delta":
+                                            usage.update(payload.get("usage", {}))
+                                            final_usage = True
+                                        elif event_type == "content_block_delta":
+                                            streamed_chars += len(payload["delta"].get("text", ""))
+                                        elif event_type == "error" and is_retryable(response.status_code, line):
+                                            UPSTREAM_ERRORS.inc(status="stream_overloaded")
+                                            if attempt < self.governor.max_retries:
+                                                overloaded = True
+                                                break
+                                            self.governor.exhausted += 1
+                                        yield event_type, payload
+                                        event_type = None
+                            finally:
+                                if not final_usage and usage:
+                                    # Closed before message_delta: message_start's output_tokens is only 1,
+                                    # so estimate from the text received (~4 characters per token)
+                                    usage["output_tokens"] = max(usage.get("output_tokens", 0), streamed_chars // 4)
+                                # Charge what was actually used against the token budget
+                                record_usage(usage)
+                                if usage:
+                                    reservation.tokens = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+                            if not overloaded:
+                                return
+                            error = None
+                except httpx.HTTPError as e:
+                    # Connection failures and timeouts, including mid-stream
+                    UPSTREAM_ERRORS.inc(status=type(e).__name__)
+                    raise
+            if error is None:
+                yield "restart", {}
+                await asyncio.sleep(self.governor.backoff(attempt))
+                continue
+            if not is_retryable(error["status_code"], error["text"]) or attempt == self.governor.max_retries:
+                if is_retryable(error["status_code"], error["text"]):
+                    self.governor.exhausted += 1
+                yield "http_error", error
+                return
+            await asyncio.sleep(self.governor.backoff(attempt, retry_after))
+
+    async def _warm_up(self):
+        # Open (and keep alive) a connection so the first real request
+        # skips the TCP+TLS handshake
+        try:
+            await self.client.head(self.api_url, timeout=CONNECT_TIMEOUT)
+        except httpx.HTTPError:
+            pass
+
+    def warm_up(self):
+        """Start opening a pooled connection in the background"""
+        return self.submit(self._warm_up())
+
+    def close(self):
+        """Close pooled connections and stop the client loop"""
+        self.run(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_client_manager():
+    """Return the process-wide ClientManager, creating it on first use"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ClientManager()
+        return _manager
@@ -0,0 +1,122 @@
+"""Benchmark extract_html_from_response against the previous regex extractor.
+
+Run from the repository root:
+
+    python benchmarks/bench_extract.py [--repeat N] [--json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_extract import HtmlScanner, extract_html_from_response, create_fallback_scene, wrap_script
+
+
+# The multi-pass extractor this module replaced, kept for comparison
+def legacy_extract_html_from_response(response_text):
+    html_match = re.search(r"<!DOCTYPE html>[\s\S]*?<\/html>", response_text, re.IGNORECASE)
+    if html_match:
+        return html_match.group(0)
+
+    html_match = re.search(r"<html[\s\S]*?<\/html>", response_text, re.IGNORECASE)
+    if html_match:
+        return f"<!DOCTYPE html>\n{html_match.group(0)}"
+
+    code_matches = re.findall(r"```(?:html)?\s*([\s\S]*?)\s*```", response_text)
+    if code_matches:
+        for code in code_matches:
+            if "<html" in code.lower() or "<!doctype" in code.lower():
+                if code.lower().startswith("<!doctype html>"):
+                    return code
+                elif code.lower().startswith("<html"):
+                    return f"<!DOCTYPE html>\n{code}"
+        return wrap_script(code_matches[0])
+
+    return create_fallback_scene()
+
+
+def _scene(kilobytes):
+    body = "        const mesh = new THREE.Mesh(new THREE.BoxGeometry(1, 1, 1), material);\n"
+    lines = body * (kilobytes * 1024 // len(body))
+    return f"<!DOCTYPE html>\n<html>\n<head><title>Scene</title></head>\n<body>\n<script>\n{lines}</script>\n</body>\n</html>"
+
+
+def build_corpus():
+    """Realistic and adversarial model responses, keyed by case name"""
+    scene = _scene(300)
+    return {
+        "fenced_document_300kb": f"Here is your scene:\n\n```html\n{scene}\n```\n\nEnjoy the scene!",
+        "bare_document_300kb": scene,
+        "html_without_doctype_300kb": "Sure.\n" + scene.replace("<!DOCTYPE html>\n", ""),
+        "trailing_prose_300kb": scene + "\n\nThis scene uses primitives only. " * 2000,
+        "unterminated_fence_300kb": "```html\n" + scene.replace("</html>", ""),
+        "many_small_fences": "Notes:\n" + "```js\nconst a = 1;\n```\ntext\n" * 5000,
+        "html_in_strings": "```\n" + "const s = '<html>' + x;\n" * 2000 + "```\n",
+        "doctype_without_close": "<!DOCTYPE html>\n" + "<div>" * 50000,
+        "no_html_at_all": "I cannot produce that scene. " * 10000,
+    }
+
+
+def time_call(func, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def time_streaming(text, repeat, chunk_size=40):
+    best = float("inf")
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    for _ in range(repeat):
+        started = time.perf_counter()
+        scanner = HtmlScanner()
+        for chunk in chunks:
+            if scanner.feed(chunk):
+                break
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(repeat=5):
+    results = []
+    for name, text in build_corpus().items():
+        expected = legacy_extract_html_from_response(text)
+        if extract_html_from_response(text) != expected:
+            raise AssertionError(f"{name}: single-pass result differs from the legacy extractor")
+        results.append({
+            "case": name,
+            "bytes": len(text),
+            "legacy_ms": round(time_call(legacy_extract_html_from_response, text, repeat) * 1000, 3),
+            "single_pass_ms": round(time_call(extract_html_from_response, text, repeat) * 1000, 3),
+            "streaming_40b_chunks_ms": round(time_streaming(text, repeat) * 1000, 3),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case; the best time is reported")
+    parser.add_argument("--json", action="store_true", help="emit machine-readable JSON")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.json:
+        print(json.dumps({"benchmark": "extract_html", "results": results}, indent=2))
+        return
+
+    print(f"{'case':32} {'bytes':>9} {'legacy ms':>10} {'single ms':>10} {'stream ms':>10}")
+    for row in results:
+        print(
+            f"{row['case']:32} {row['bytes']:>9} {row['legacy_ms']:>10} "
+            f"{row['single_pass_ms']:>10} {row['streaming_40b_chunks_ms']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""End-to-end benchmark of generate_scene_from_prompt against the mock Messages API.
+
+Run from the repository root:
+
+    python benchmarks/bench_pipeline.py [--prompts N] [--concurrency N] [--json]
+
+The mock's latency, token rate and error injection are set with the same
+flags as benchmarks/mock_api.py. Caches live in a temporary directory, so
+runs never touch .cache/ or the real API.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_api import MockMessagesServer, add_config_arguments, config_from_args
+
+SUBJECTS = [
+    "a lion sitting under a tree",
+    "a futuristic city at night",
+    "a lighthouse on a rocky coast",
+    "a campfire in a pine forest",
+    "a windmill on a grassy hill",
+    "a sailboat on a calm lake",
+    "a snowman in a snowy park",
+    "a volcano erupting at dusk",
+    "a robot walking through a desert",
+    "a hot air balloon over mountains",
+    "a koi pond with lily pads",
+    "a space station orbiting a planet"
+]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)], 3)
+
+
+async def run_scenario(engine, prompts, concurrency, **options):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    outcomes = {}
+
+    async def run_one(prompt):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                html_content, debug_info = await engine.generate_scene_from_prompt(prompt, **options)
+                outcome = debug_info.get("scene_cache", "miss") if html_content else "failed"
+            except Exception as e:
+                debug_info, outcome = {}, f"error:{type(e).__name__}"
+            latencies.append(time.perf_counter() - started)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        # A stream closed at </html> never sees the final usage and must keep its estimate
+        stream = debug_info.get("stream")
+        if stream and stream["stopped_at_html_end"] and stream["tokens_received"] <= 1:
+            raise AssertionError(f"{prompt}: stream stopped at </html> reported {stream['tokens_received']} tokens")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_one(prompt) for prompt in prompts))
+    wall = time.perf_counter() - started
+    return {
+        "prompts": len(prompts),
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "scenes_per_min": round(len(prompts) / wall * 60, 2),
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": round(max(latencies), 3)
+        },
+        "outcomes": outcomes
+    }
+
+
+def run(args):
+    server = MockMessagesServer(config_from_args(args))
+    cache_dir = tempfile.mkdtemp(prefix="bench-pipeline-")
+    # The engine reads its endpoint and cache location on import
+    os.environ["ANTHROPIC_API_URL"] = server.url
+    os.environ["ANTHROPIC_API_KEY"] = "mock"
+    os.environ["SCENE_CACHE_DIR"] = cache_dir
+    os.environ["GOVERNOR_RPM"] = str(args.rpm)
+    os.environ["GOVERNOR_TPM"] = str(args.tpm)
+    import scene_engine
+
+    prompts = [f"{SUBJECTS[i % len(SUBJECTS)]} #{i}" for i in range(args.prompts)]
+    scenarios = [
+        ("cold_request", prompts, {"stream": False, "reuse_similar": False}),
+        ("cold_stream", [f"{prompt} (streamed)" for prompt in prompts], {"stream": True, "reuse_similar": False}),
+        ("warm_scene_cache", prompts, {"stream": False, "reuse_similar": False}),
+        ("cold_speculative", [f"{prompt} (speculative)" for prompt in prompts], {"stream": True, "reuse_similar": False, "speculative": True}),
+        ("duplicate_burst", [f"{SUBJECTS[0]} (burst)"] * args.prompts, {"stream": True, "reuse_similar": False})
+    ]
+
+    results = []
+    for name, scenario_prompts, options in scenarios:
+        before = server.stats().get("requests", 0)
+        result = scene_engine.api_client.run(run_scenario(scene_engine, scenario_prompts, args.concurrency, **options))
+        result["scenario"] = name
+        result["upstream_requests"] = server.stats().get("requests", 0) - before
+        results.append(result)
+
+    mock_stats = server.stats()
+    governor = scene_engine.api_client.governor.stats()
+    server.close()
+    return results, mock_stats, governor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=12, help="prompts per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="prompts in flight at once")
+    parser.add_argument("--rpm", type=int, default=0, help="governor requests-per-minute budget (0: off)")
+    parser.add_argument("--tpm", type=int, default=0, help="governor tokens-per-minute budget (0: off)")
+    parser.add_argument("--json", action="store_true", help="emit machine-readable JSON")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    results, mock_stats, governor = run(args)
+    if args.json:
+        print(json.dumps({
+            "benchmark": "pipeline",
+            "mock": {key: value for key, value in vars(args).items() if key not in ("json",)},
+            "results": results,
+            "mock_stats": mock_stats,
+            "governor": governor
+        }, indent=2))
+        return
+
+    print(f"{'scenario':20} {'wall s':>8} {'scn/min':>8} {'p50 s':>7} {'p95 s':>7} {'upstream':>9}  outcomes")
+    for row in results:
+        print(
+            f"{row['scenario']:20} {row['wall_s']:>8} {row['scenes_per_min']:>8} "
+            f"{row['latency_s']['p50']:>7} {row['latency_s']['p95']:>7} {row['upstream_requests']:>9}  {row['outcomes']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
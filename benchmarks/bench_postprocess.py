@@ -0,0 +1,122 @@
+"""Benchmark fix_cdn_urls, remove_gltf_loader and the fused postprocess_html.
+
+Run from the repository root:
+
+    python benchmarks/bench_postprocess.py [--repeat N] [--json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from example_library import ExampleLibrary
+from postprocess import PRIMITIVE_LION_SCRIPT, fix_cdn_urls, remove_gltf_loader, postprocess_html
+
+GLTF_SNIPPET = """
+        const loader = new THREE.GLTFLoader();
+        loader.load('models/lion.glb', function (gltf) {
+            scene.add(gltf.scene);
+        });
+"""
+
+# A loader block whose gap before loader.load() holds a comparison
+GLTF_SNIPPET_WITH_LOOP = """
+        const loader = new THREE.GLTFLoader();
+        for (let i = 0; i < 3; i++) { lights[i].intensity = 0.5; }
+        loader.load('models/lion.glb', function (gltf) {
+            scene.add(gltf.scene);
+        });
+"""
+
+CDN_SCRIPTS = """
+    <script src="https://cdn.jsdelivr.net/npm/three@0.150.1/build/three.min.js"></script>
+    <script src="https://cdnjs.cloudflare.com/ajax/libs/three.js/r128/controls/OrbitControls.js"></script>
+    <script src="https://unpkg.com/three@0.152.0/examples/js/loaders/GLTFLoader.js"></script>
+"""
+
+
+# The multi-pass GLTF removal the rule pipeline replaced, kept for comparison
+def legacy_remove_gltf_loader(html_content):
+    html_content = re.sub(r'<script src="[^"]*GLTFLoader[^"]*"><\/script>', '', html_content)
+    if "GLTFLoader" in html_content or "loader.load(" in html_content:
+        html_content = html_content.replace("</body>", PRIMITIVE_LION_SCRIPT)
+        html_content = re.sub(
+            r'const loader = new THREE\.GLTFLoader\(\);[\s\S]*?loader\.load\([^\)]*\)[^\}]*\}\);',
+            '// External model loading removed',
+            html_content
+        )
+    return html_content
+
+
+def build_corpus():
+    """Realistic scenes plus adversarial inputs, keyed by case name"""
+    examples = {example["id"]: example["html"] for example in ExampleLibrary.load().examples}
+    lion = examples.get("lion", next(iter(examples.values())))
+    city = examples.get("city", lion)
+    body = "        mesh.rotation.y += 0.01; // spin\n"
+    filler = body * (300 * 1024 // len(body))
+    return {
+        "lion_example": lion,
+        "city_example": city,
+        "other_cdns_and_gltf": lion.replace("<head>", "<head>" + CDN_SCRIPTS).replace("</script>\n</body>", GLTF_SNIPPET + "</script>\n</body>"),
+        "gltf_block_with_loop": lion.replace("</script>\n</body>", GLTF_SNIPPET_WITH_LOOP + "</script>\n</body>"),
+        "clean_scene_300kb": city.replace("</script>\n</body>", filler + "</script>\n</body>"),
+        "many_cdn_urls": "\n".join(['<script src="//unpkg.com/three/build/three.js"></script>'] * 5000),
+        "many_loader_calls": "<html><body><script>" + "loader.load('a.glb');\n" * 10000 + "</script></body></html>",
+        "unclosed_gltf_blocks": "<html><body><script>" + "const loader = new THREE.GLTFLoader();\n" * 2000 + "</script></body></html>",
+        "near_miss_urls_300kb": "https://unpkg.com/thre " * (300 * 1024 // 23),
+    }
+
+
+def time_call(func, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(repeat=5):
+    results = []
+    for name, text in build_corpus().items():
+        # The fused pipeline must agree with the two passes applied in turn
+        if postprocess_html(text)[0] != remove_gltf_loader(fix_cdn_urls(text)):
+            raise AssertionError(f"{name}: postprocess_html differs from fix_cdn_urls + remove_gltf_loader")
+        if remove_gltf_loader(text) != legacy_remove_gltf_loader(text):
+            raise AssertionError(f"{name}: remove_gltf_loader differs from the legacy regexes")
+        results.append({
+            "case": name,
+            "bytes": len(text),
+            "fix_cdn_urls_ms": round(time_call(fix_cdn_urls, text, repeat) * 1000, 3),
+            "remove_gltf_loader_ms": round(time_call(remove_gltf_loader, text, repeat) * 1000, 3),
+            "postprocess_html_ms": round(time_call(postprocess_html, text, repeat) * 1000, 3),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case; the best time is reported")
+    parser.add_argument("--json", action="store_true", help="emit machine-readable JSON")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.json:
+        print(json.dumps({"benchmark": "postprocess", "results": results}, indent=2))
+        return
+
+    print(f"{'case':24} {'bytes':>9} {'cdn ms':>9} {'gltf ms':>9} {'fused ms':>9}")
+    for row in results:
+        print(
+            f"{row['case']:24} {row['bytes']:>9} {row['fix_cdn_urls_ms']:>9} "
+            f"{row['remove_gltf_loader_ms']:>9} {row['postprocess_html_ms']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Benchmark the CPU cost of a Streamlit rerun of app.py, plus prompt building.
+
+Run from the repository root:
+
+    python benchmarks/bench_rerun.py [--reruns N] [--json]
+
+The app runs headless under Streamlit's AppTest against the mock Messages
+API, with caches and history in a temporary directory. Reruns are timed
+on an empty history and with a generated scene loaded, which is what
+every widget interaction costs.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_api import MockConfig, MockMessagesServer
+
+OWNER = "bench-rerun"
+
+
+def time_reruns(app, reruns):
+    cpu, wall = [], []
+    for _ in range(reruns):
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        app.run()
+        cpu.append(time.process_time() - cpu_started)
+        wall.append(time.perf_counter() - wall_started)
+    return {
+        "reruns": reruns,
+        "cpu_ms": round(min(cpu) * 1000, 3),
+        "cpu_avg_ms": round(sum(cpu) / len(cpu) * 1000, 3),
+        "wall_ms": round(min(wall) * 1000, 3)
+    }
+
+
+def time_call(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 3)
+
+
+def bench_prompts(repeat):
+    """Per-request system prompt construction, rebuilt versus built once"""
+    import scene_engine
+
+    rows = []
+    if hasattr(scene_engine, "generation_system_prompt"):
+        example_ids = tuple(example["id"] for example in scene_engine.example_library.examples[:scene_engine.GENERATION_EXAMPLE_COUNT])
+        rows.append({
+            "case": "generation_system_prompt",
+            "build_ms": time_call(lambda: scene_engine.generation_system_prompt.__wrapped__(example_ids), repeat),
+            "cached_ms": time_call(lambda: scene_engine.generation_system_prompt(example_ids), repeat)
+        })
+        rows.append({
+            "case": "enhance_system_prompt",
+            "build_ms": time_call(lambda: scene_engine.build_enhance_system_prompt(scene_engine.EXAMPLE_MAPPINGS), repeat),
+            "cached_ms": time_call(lambda: scene_engine.ENHANCE_SYSTEM_PROMPT, repeat)
+        })
+    return rows
+
+
+def run(reruns=20):
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return None
+
+    server = MockMessagesServer(MockConfig(latency=0.0, jitter=0.0, tokens_per_sec=1e6, seed=0))
+    state_dir = tempfile.mkdtemp(prefix="bench-rerun-")
+    # The engine and history store read their endpoint and paths on import
+    os.environ["ANTHROPIC_API_URL"] = server.url
+    os.environ["ANTHROPIC_API_KEY"] = "mock"
+    os.environ["SCENE_CACHE_DIR"] = state_dir
+    os.environ["SCENE_HISTORY_PATH"] = os.path.join(state_dir, "history.sqlite3")
+    os.environ["GOVERNOR_RPM"] = "0"
+    os.environ["GOVERNOR_TPM"] = "0"
+    os.chdir(ROOT)
+
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    app.query_params["owner"] = OWNER
+    started = time.perf_counter()
+    app.run()
+    first_run_ms = round((time.perf_counter() - started) * 1000, 3)
+    empty = time_reruns(app, reruns)
+
+    # Generate one scene through the engine and open it from the history sidebar
+    import scene_engine
+    from history_store import HistoryStore
+    html_content, debug_info = scene_engine.api_client.run(
+        scene_engine.generate_scene_from_prompt("a lion sitting under a tree", reuse_similar=False)
+    )
+    record = scene_engine.compact_scene("a lion sitting under a tree", html_content, debug_info)
+    record["timestamp"] = "2024-01-01 00:00:00"
+    scene_id = HistoryStore(os.environ["SCENE_HISTORY_PATH"]).add(OWNER, record)
+    app.run()
+    app.button(key=f"load_{scene_id}").click().run()
+    loaded = time_reruns(app, reruns)
+
+    server.close()
+    return {
+        "first_run_ms": first_run_ms,
+        "reruns": [dict(empty, case="empty_history"), dict(loaded, case="scene_loaded")],
+        "prompts": bench_prompts(max(reruns, 5))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=20, help="timed reruns per case; the best time is reported")
+    parser.add_argument("--json", action="store_true", help="emit machine-readable JSON")
+    args = parser.parse_args()
+
+    result = run(args.reruns)
+    if result is None:
+        sys.exit("streamlit is not installed")
+    if args.json:
+        print(json.dumps(dict(result, benchmark="rerun"), indent=2))
+        return
+
+    print(f"first run: {result['first_run_ms']} ms")
+    print(f"{'case':16} {'cpu ms':>9} {'avg ms':>9} {'wall ms':>9}")
+    for row in result["reruns"]:
+        print(f"{row['case']:16} {row['cpu_ms']:>9} {row['cpu_avg_ms']:>9} {row['wall_ms']:>9}")
+    for row in result["prompts"]:
+        print(f"{row['case']:26} build {row['build_ms']} ms, cached {row['cached_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Local stand-in for the Messages API, for benchmarks that must not spend real calls.
+
+Run standalone and point the app at it:
+
+    python benchmarks/mock_api.py --port 8765 --latency 0.5 --tokens-per-sec 400
+    ANTHROPIC_API_URL=http://127.0.0.1:8765/v1/messages streamlit run app.py
+
+or start it in-process with ``MockMessagesServer(...)``. Enhancement
+requests get a canned scene description, generation requests one of the
+reference scenes wrapped in a fenced code block; both honour ``stream``
+with SSE events paced at the configured token rate.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from example_library import ExampleLibrary
+
+# Roughly four characters per token, as the pipeline itself assumes
+CHARS_PER_TOKEN = 4
+CHUNK_TOKENS = 8
+
+
+class MockConfig:
+    """Latency, throughput and error injection settings of a mock server"""
+
+    def __init__(
+        self,
+        latency=0.2,
+        jitter=0.1,
+        tokens_per_sec=500.0,
+        error_rate=0.0,
+        error_status=529,
+        retry_after=None,
+        stall_rate=0.0,
+        stall_seconds=5.0,
+        stream_error_rate=0.0,
+        seed=None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.stream_error_rate = stream_error_rate
+        self.random = random.Random(seed)
+
+
+def _enhanced_text(prompt):
+    return (
+        f"A scene based on {prompt}, built entirely from THREE.js primitive shapes. "
+        "A wide green plane forms the ground, lit by warm directional sunlight with soft shadows "
+        "and a pale blue ambient fill. Boxes, spheres and cylinders in saturated colors make up "
+        "the main objects, which sway and rotate gently in a slow animation loop. "
+        "OrbitControls let the viewer rotate, pan and zoom around the scene."
+    )
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    config = None
+    scenes = ()
+    counters = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _count(self, name):
+        with self.counters["lock"]:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def do_HEAD(self):
+        # Connection warm-up
+        self.send_response(405)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        try:
+            self._respond()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away: a stream closed at </html>, or a cancelled request
+            self._count("client_disconnects")
+
+    def _respond(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        config = self.config
+        self._count("requests")
+
+        time.sleep(max(config.latency + config.random.uniform(-config.jitter, config.jitter), 0.0))
+        if config.random.random() < config.error_rate:
+            self._count(f"errors_{config.error_status}")
+            payload = json.dumps({
+                "type": "error",
+                "error": {"type": "overloaded_error" if config.error_status == 529 else "rate_limit_error"}
+            }).encode()
+            self.send_response(config.error_status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            if config.retry_after is not None:
+                self.send_header("retry-after", str(config.retry_after))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        if config.random.random() < config.stall_rate:
+            self._count("stalls")
+            time.sleep(config.stall_seconds)
+
+        prompt = str(body.get("messages", [{}])[-1].get("content", ""))
+        if "Transform this simple description" in prompt:
+            text = _enhanced_text(prompt.split('"')[1] if '"' in prompt else "the prompt")
+        else:
+            scene = self.scenes[config.random.randrange(len(self.scenes))]
+            text = f"Here is your scene:\n\n```html\n{scene}\n```\n\nIt uses only primitives."
+        limit = body.get("max_tokens", 4096) * CHARS_PER_TOKEN
+        stop_reason = "max_tokens" if len(text) > limit else "end_turn"
+        text = text[:limit]
+        input_tokens = len(json.dumps(body.get("system", ""))) // CHARS_PER_TOKEN + len(prompt) // CHARS_PER_TOKEN
+        output_tokens = max(len(text) // CHARS_PER_TOKEN, 1)
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+
+        if body.get("stream"):
+            self._stream(body, text, usage, stop_reason)
+        else:
+            time.sleep(output_tokens / config.tokens_per_sec)
+            payload = json.dumps({
+                "id": "msg_mock",
+                "type": "message",
+                "role": "assistant",
+                "model": body.get("model", ""),
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": stop_reason,
+                "usage": usage
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    def _stream(self, body, text, usage, stop_reason):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send(event, data):
+            self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+            self.wfile.flush()
+
+        send("message_start", {
+            "type": "message_start",
+            "message": {"model": body.get("model", ""), "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 1}}
+        })
+        send("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        step = CHUNK_TOKENS * CHARS_PER_TOKEN
+        # An overloaded error event halfway through the text, as the API sends under load
+        fail_at = len(text) // 2 if self.config.random.random() < self.config.stream_error_rate else None
+        for start in range(0, len(text), step):
+            if fail_at is not None and start >= fail_at:
+                self._count("stream_errors")
+                send("error", {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+                return
+            time.sleep(CHUNK_TOKENS / self.config.tokens_per_sec)
+            send("content_block_delta", {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": text[start:start + step]}
+            })
+        send("content_block_stop", {"type": "content_block_stop", "index": 0})
+        send("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": stop_reason},
+            "usage": {"output_tokens": usage["output_tokens"]}
+        })
+        send("message_stop", {"type": "message_stop"})
+
+
+class MockMessagesServer:
+    """Mock Messages endpoint on a background thread; ``url`` is the API URL to use"""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        self.counters = {"lock": threading.Lock()}
+        scenes = tuple(example["html"] for example in ExampleLibrary.load().examples)
+        handler = type("MockHandler", (_MockHandler,), {
+            "config": self.config,
+            "scenes": scenes,
+            "counters": self.counters
+        })
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/v1/messages"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-messages-api", daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        with self.counters["lock"]:
+            return {key: value for key, value in self.counters.items() if key != "lock"}
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def add_config_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.1, help="+/- seconds added to the latency")
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0, help="output token rate")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=529, help="status of injected errors")
+    parser.add_argument("--retry-after", type=float, default=None, help="retry-after header on injected errors")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="fraction of requests that stall")
+    parser.add_argument("--stall-seconds", type=float, default=5.0, help="length of an injected stall")
+    parser.add_argument("--stream-error-rate", type=float, default=0.0, help="fraction of streams that fail half-way")
+    parser.add_argument("--seed", type=int, default=None, help="seed for latency and error injection")
+
+
+def config_from_args(args):
+    return MockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+        stream_error_rate=args.stream_error_rate,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockMessagesServer(config_from_args(args), args.host, args.port)
+    print(f"Mock Messages API listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Run every benchmark and write one JSON report, optionally compared to a baseline.
+
+Run from the repository root:
+
+    python benchmarks/run_all.py --output bench-$(git rev-parse --short HEAD).json
+    python benchmarks/run_all.py --compare bench-abc1234.json
+
+The report records the commit it was run on. With ``--compare``, every
+timing that got slower than ``--threshold`` times the baseline is listed
+and the exit status is 1, so the script can gate a CI job.
+"""
+import os
+import sys
+import json
+import platform
+import argparse
+import subprocess
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_extract
+import bench_postprocess
+import bench_pipeline
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timings(report):
+    """Flatten a report into {"benchmark/case/metric": milliseconds}"""
+    flat = {}
+    for benchmark in ("extract_html", "postprocess"):
+        for row in report[benchmark]:
+            for metric, value in row.items():
+                if metric.endswith("_ms"):
+                    flat[f"{benchmark}/{row['case']}/{metric}"] = value
+    for row in report["pipeline"]:
+        flat[f"pipeline/{row['scenario']}/p50_ms"] = row["latency_s"]["p50"] * 1000
+        flat[f"pipeline/{row['scenario']}/wall_ms"] = row["wall_s"] * 1000
+    return flat
+
+
+def compare(report, baseline, threshold):
+    current, previous = timings(report), timings(baseline)
+    regressions = []
+    for key, value in sorted(current.items()):
+        before = previous.get(key)
+        # Sub-millisecond timings are too noisy to compare
+        if before and max(before, value) >= 1.0 and value > before * threshold:
+            regressions.append({"metric": key, "baseline_ms": before, "current_ms": value, "ratio": round(value / before, 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per microbenchmark case")
+    parser.add_argument("--prompts", type=int, default=12, help="prompts per pipeline scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="pipeline prompts in flight at once")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="baseline report to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    # A fixed, fast mock so pipeline timings measure our overhead, not the model
+    pipeline_args = SimpleNamespace(
+        prompts=args.prompts,
+        concurrency=args.concurrency,
+        rpm=0,
+        tpm=0,
+        latency=0.05,
+        jitter=0.0,
+        tokens_per_sec=20000.0,
+        error_rate=0.0,
+        error_status=529,
+        retry_after=None,
+        stall_rate=0.0,
+        stall_seconds=0.0,
+        seed=0
+    )
+    pipeline, mock_stats, governor = bench_pipeline.run(pipeline_args)
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "extract_html": bench_extract.run(args.repeat),
+        "postprocess": bench_postprocess.run(args.repeat),
+        "pipeline": pipeline,
+        "mock_stats": mock_stats,
+        "governor": governor
+    }
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["compared_to"] = baseline.get("commit")
+        report["regressions"] = compare(report, baseline, args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for regression in report.get("regressions", []):
+        print(
+            f"REGRESSION {regression['metric']}: {regression['baseline_ms']} -> "
+            f"{regression['current_ms']} ms ({regression['ratio']}x)",
+            file=sys.stderr
+        )
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
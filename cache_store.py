@@ -0,0 +1,135 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from metrics import CACHE_LOOKUPS
+
+# Directory for all on-disk caches
+CACHE_DIR = os.getenv("SCENE_CACHE_DIR", ".cache")
+
+# Quotes, whitespace and trailing punctuation around a prompt
+PROMPT_EDGES = re.compile(r"^[\s\"'“”]+|[\s\"'“”.!?]+$")
+
+
+def normalize_prompt(prompt):
+    """Normalize a prompt so trivially different spellings share a cache key"""
+    prompt = " ".join(prompt.lower().split())
+    return PROMPT_EDGES.sub("", prompt)
+
+
+def hash_text(text):
+    """Stable hex digest of a string"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(*parts):
+    """Build a cache key from any JSON-serializable parts"""
+    return hash_text(json.dumps(parts, sort_keys=True, ensure_ascii=False))
+
+
+class DiskCache:
+    """SQLite-backed key/value cache with LRU eviction.
+
+    Entries are evicted least-recently-used first once either ``max_entries``
+    or ``max_bytes`` is exceeded, and expire ``ttl`` seconds after they were
+    written. Values may be ``str`` or ``bytes`` and come back as written.
+    """
+
+    def __init__(self, path, max_entries=None, max_bytes=None, ttl=None):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                is_text INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+
+    def get(self, key):
+        """Return the cached value or None, refreshing its LRU position"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, is_text, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is not None and self.ttl is not None and row[2] < now - self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache=self.name, outcome="miss")
+                return None
+
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache=self.name, outcome="hit")
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            value, is_text, _ = row
+            return bytes(value).decode("utf-8") if is_text else bytes(value)
+
+    def set(self, key, value):
+        """Store a value and evict entries beyond the configured bounds"""
+        is_text = isinstance(value, str)
+        blob = value.encode("utf-8") if is_text else bytes(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, int(is_text), len(blob), now, now)
+            )
+            self._evict(now)
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def _evict(self, now):
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl,))
+
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        excess_entries = count - self.max_entries if self.max_entries is not None else 0
+        excess_bytes = total - self.max_bytes if self.max_bytes is not None else 0
+        if excess_entries <= 0 and excess_bytes <= 0:
+            return
+
+        # Walk from least recently used until both bounds hold again
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            doomed.append((key,))
+            excess_entries -= 1
+            excess_bytes -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def stats(self):
+        """Hit/miss counters for this process plus the current on-disk footprint"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total}
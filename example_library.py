@@ -0,0 +1,75 @@
+import os
+import json
+import math
+from collections import Counter
+from similarity_index import prompt_tokens
+from postprocess import fix_cdn_urls
+
+# Reference scenes shipped with the app
+EXAMPLES_DIR = os.getenv("EXAMPLES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples"))
+
+# BM25 parameters; words of the simple prompt count SIMPLE_WEIGHT times
+BM25_K1 = 1.2
+BM25_B = 0.75
+SIMPLE_WEIGHT = 3
+
+
+class ExampleLibrary:
+    """Reference scenes (simple prompt, enhanced prompt, HTML) with a BM25 index.
+
+    The inverted index is built once when the library is loaded, so ranking
+    a prompt only walks the postings of its own words rather than every
+    example. Stop words are dropped, which keeps words like "a" or "with"
+    from matching everything.
+    """
+
+    def __init__(self, examples):
+        self.examples = examples
+        self._postings = {}
+        self._lengths = []
+        for index, example in enumerate(examples):
+            terms = Counter()
+            for _ in range(SIMPLE_WEIGHT):
+                terms.update(prompt_tokens(example["simple"]))
+            terms.update(prompt_tokens(example["enhanced"]))
+            self._lengths.append(sum(terms.values()))
+            for term, count in terms.items():
+                self._postings.setdefault(term, []).append((index, count))
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+
+    @classmethod
+    def load(cls, directory=EXAMPLES_DIR):
+        """Load library.json and the reference HTML files it points to, pinned to the runtime URLs"""
+        with open(os.path.join(directory, "library.json"), encoding="utf-8") as f:
+            entries = json.load(f)
+        for entry in entries:
+            with open(os.path.join(directory, entry["html"]), encoding="utf-8") as f:
+                entry["html"] = fix_cdn_urls(f.read().strip())
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.examples)
+
+    def featured(self):
+        """Examples used as few-shot mappings in the enhancement prompt"""
+        return [example for example in self.examples if example.get("featured")]
+
+    def search(self, prompt, k=1):
+        """Return up to k (example, score) pairs ranked by BM25 relevance"""
+        scores = {}
+        count = len(self.examples)
+        for term in prompt_tokens(prompt):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[index] / self._average_length)
+                scores[index] = scores.get(index, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(self.examples[index], round(score, 3)) for index, score in ranked]
+
+    def best_matches(self, prompt, k=1):
+        """Like search, but defaulting to the first example (the city) when nothing matches"""
+        return self.search(prompt, k) or [(self.examples[0], 0.0)]
@@ -0,0 +1,168 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Process-wide upstream limits; 0 disables a budget
+GOVERNOR_MAX_CONCURRENT = int(os.getenv("GOVERNOR_MAX_CONCURRENT", "8"))
+GOVERNOR_RPM = int(os.getenv("GOVERNOR_RPM", "50"))
+GOVERNOR_TPM = int(os.getenv("GOVERNOR_TPM", "100000"))
+
+# Retry policy for throttled or overloaded responses
+GOVERNOR_MAX_RETRIES = int(os.getenv("GOVERNOR_MAX_RETRIES", "4"))
+GOVERNOR_BASE_DELAY = float(os.getenv("GOVERNOR_BASE_DELAY", "1.0"))
+GOVERNOR_MAX_DELAY = float(os.getenv("GOVERNOR_MAX_DELAY", "30.0"))
+
+# 429 is rate limiting, 529 is the API's "overloaded" status
+RETRYABLE_STATUS = {429, 529}
+
+WINDOW = 60.0
+
+
+def estimate_tokens(data):
+    """Upper bound on the tokens a request can use: ~4 chars per input token plus max_tokens"""
+    chars = len(str(data.get("system", ""))) + len(str(data.get("messages", "")))
+    return chars // 4 + data.get("max_tokens", 0)
+
+
+def is_retryable(status_code, text=""):
+    return status_code in RETRYABLE_STATUS or "overloaded_error" in text
+
+
+def parse_retry_after(value):
+    """Seconds from a retry-after header, or None if absent or not a number"""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class Reservation:
+    """Budget entry for one request; ``tokens`` is settled to actual usage when known"""
+
+    def __init__(self, at, tokens):
+        self.at = at
+        self.tokens = tokens
+
+
+class Governor:
+    """Shared limiter for every upstream call in the process.
+
+    A request holds one of ``max_concurrent`` slots while it runs and is
+    charged against requests-per-minute and tokens-per-minute budgets over
+    a sliding 60 second window; callers that would exceed either wait in
+    a queue instead of failing. A throttled response pauses every caller
+    until its ``retry-after`` has passed. Must be used from a single event
+    loop (the ``ClientManager`` loop).
+    """
+
+    def __init__(
+        self,
+        max_concurrent=GOVERNOR_MAX_CONCURRENT,
+        rpm=GOVERNOR_RPM,
+        tpm=GOVERNOR_TPM,
+        max_retries=GOVERNOR_MAX_RETRIES,
+        base_delay=GOVERNOR_BASE_DELAY,
+        max_delay=GOVERNOR_MAX_DELAY
+    ):
+        self.max_concurrent = max_concurrent
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._window = deque()
+        self._condition = None
+        self._paused_until = 0.0
+
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.retries = 0
+        self.exhausted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _delay(self, now, tokens):
+        # Seconds until both budgets have room for this request
+        while self._window and self._window[0].at <= now - WINDOW:
+            self._window.popleft()
+        delay = max(self._paused_until - now, 0.0)
+        if self.rpm and len(self._window) >= self.rpm:
+            delay = max(delay, self._window[len(self._window) - self.rpm].at + WINDOW - now)
+        if self.tpm:
+            # Oldest entries expire first; find when enough tokens free up
+            used = sum(entry.tokens for entry in self._window)
+            tokens = min(tokens, self.tpm)
+            for entry in self._window:
+                if used + tokens <= self.tpm:
+                    break
+                used -= entry.tokens
+                delay = max(delay, entry.at + WINDOW - now)
+        return delay
+
+    @asynccontextmanager
+    async def slot(self, tokens):
+        """Wait for a concurrency slot and budget, yielding the request's Reservation"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        queued_at = time.monotonic()
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            async with self._condition:
+                while True:
+                    now = time.monotonic()
+                    delay = self._delay(now, tokens)
+                    if delay <= 0 and self.in_flight < self.max_concurrent:
+                        break
+                    try:
+                        # Woken by a released slot, or when the budget frees up
+                        await asyncio.wait_for(self._condition.wait(), timeout=delay if delay > 0 else None)
+                    except asyncio.TimeoutError:
+                        pass
+                self.in_flight += 1
+                reservation = Reservation(now, tokens)
+                self._window.append(reservation)
+        finally:
+            self.queue_depth -= 1
+
+        waited = time.monotonic() - queued_at
+        self.requests += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        try:
+            yield reservation
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def backoff(self, attempt, retry_after=None):
+        """Delay before retry ``attempt`` (0-based); also pauses other callers for retry-after"""
+        self.retries += 1
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is not None:
+            # Honor the server's hint, with a little jitter so waiters do not stampede
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            return retry_after + random.uniform(0, self.base_delay)
+        # Full jitter exponential backoff
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def stats(self):
+        """Queue and throughput metrics for debug output"""
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "requests": self.requests,
+            "retries": self.retries,
+            "retries_exhausted": self.exhausted,
+            "avg_wait_s": round(self.wait_total / self.requests, 3) if self.requests else 0.0,
+            "max_wait_s": round(self.wait_max, 3),
+            "window_requests": len(self._window),
+            "window_tokens": sum(entry.tokens for entry in self._window)
+        }
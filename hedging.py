@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+# Hedging policy; off unless HEDGE_REQUESTS=1
+HEDGE_ENABLED = os.getenv("HEDGE_REQUESTS", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2.0"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies with percentile lookup"""
+
+    def __init__(self, window=HEDGE_WINDOW):
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+class Hedger:
+    """Launches a duplicate request when the first one is slow to produce output.
+
+    Each kind of request (e.g. streamed or single-response generation)
+    learns how long it usually takes to produce its first output. If a
+    request has not produced output by the ``percentile`` of recent
+    latencies, an identical second attempt is started; the first attempt
+    to succeed wins and the other is cancelled. At most ``max_rate`` of
+    recent requests may be hedged, and nothing is hedged until
+    ``min_samples`` latencies have been seen.
+    """
+
+    def __init__(
+        self,
+        enabled=HEDGE_ENABLED,
+        percentile=HEDGE_PERCENTILE,
+        max_rate=HEDGE_MAX_RATE,
+        min_samples=HEDGE_MIN_SAMPLES,
+        min_delay=HEDGE_MIN_DELAY,
+        window=HEDGE_WINDOW
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.window = window
+        self.trackers = {}
+        self._recent = deque(maxlen=window)
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self.extra_tokens = 0
+
+    def tracker(self, kind):
+        return self.trackers.setdefault(kind, LatencyTracker(self.window))
+
+    def delay(self, kind):
+        """Seconds to wait for first output before hedging, or None if hedging is not allowed"""
+        tracker = self.tracker(kind)
+        if not self.enabled or len(tracker) < self.min_samples:
+            return None
+        if self._recent and sum(self._recent) / len(self._recent) >= self.max_rate:
+            return None
+        return max(tracker.percentile(self.percentile), self.min_delay)
+
+    async def run(self, kind, attempt, succeeded):
+        """Run ``attempt(index, first_output)`` with an optional hedge.
+
+        ``attempt`` returns a coroutine and sets the ``first_output`` event
+        once it has produced output. Returns ``(result, info)`` where info
+        says whether a hedge fired and which attempt won.
+        """
+        self.requests += 1
+        started = time.perf_counter()
+        delay = self.delay(kind)
+        events = [asyncio.Event()]
+        tasks = [asyncio.create_task(attempt(0, events[0]))]
+
+        async def watch(index, attempt_started):
+            await events[index].wait()
+            self.tracker(kind).add(time.perf_counter() - attempt_started)
+        watchers = [asyncio.create_task(watch(0, started))]
+
+        fired = False
+        winner = None
+        try:
+            if delay is not None:
+                await asyncio.wait({tasks[0], watchers[0]}, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not tasks[0].done() and not events[0].is_set():
+                    fired = True
+                    self.fired += 1
+                    events.append(asyncio.Event())
+                    tasks.append(asyncio.create_task(attempt(1, events[1])))
+                    watchers.append(asyncio.create_task(watch(1, time.perf_counter())))
+            self._recent.append(fired)
+
+            # First successful attempt wins; a failed one defers to the other
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task in done and not task.cancelled() and task.exception() is None and succeeded(task.result()):
+                        winner = tasks.index(task)
+                        break
+        finally:
+            # Also runs when the caller is cancelled, so no attempt outlives it
+            leftover = [task for task in tasks + watchers if not task.done()]
+            for task in leftover:
+                task.cancel()
+            await asyncio.gather(*leftover, return_exceptions=True)
+
+        if winner is None:
+            # Neither succeeded: report the primary's outcome
+            winner = 0
+        if fired and winner == 1:
+            self.won += 1
+        info = {
+            "fired": fired,
+            "delay_s": round(delay, 3) if delay is not None else None,
+            "winner": "hedge" if winner == 1 else "primary",
+            "cancelled": ["primary", "hedge"][1 - winner] if fired and tasks[1 - winner].cancelled() else None
+        }
+        return tasks[winner].result(), info
+
+    def record_extra_tokens(self, tokens):
+        self.extra_tokens += tokens
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "requests": self.requests,
+            "hedges_fired": self.fired,
+            "hedges_won": self.won,
+            "hedge_rate": round(self.fired / self.requests, 3) if self.requests else 0.0,
+            "extra_tokens": self.extra_tokens,
+            "delays_s": {
+                kind: round(self.delay(kind), 3) if self.delay(kind) is not None else None
+                for kind in self.trackers
+            }
+        }
@@ -0,0 +1,118 @@
+import os
+import json
+import sqlite3
+import threading
+
+from cache_store import CACHE_DIR
+
+# Default location of the persistent scene history
+HISTORY_PATH = os.getenv("SCENE_HISTORY_PATH", os.path.join(CACHE_DIR, "history.sqlite3"))
+
+
+class HistoryStore:
+    """Persistent per-owner scene history in SQLite.
+
+    Listing metadata (prompt, timestamp, sizes) lives in its own table and
+    the packed scene plus its debug info in another, so paging through the
+    sidebar never reads a scene blob; ``load`` fetches one on demand. Each
+    owner keeps at most ``max_entries`` scenes, oldest dropped first.
+    """
+
+    def __init__(self, path=HISTORY_PATH, max_entries=None):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS scenes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                enhanced_prompt TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                stored_bytes INTEGER NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS scene_blobs (
+                scene_id INTEGER PRIMARY KEY REFERENCES scenes (id) ON DELETE CASCADE,
+                scene BLOB NOT NULL,
+                debug_info TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS scenes_owner ON scenes (owner, id)")
+
+    def add(self, owner, record):
+        """Store a compact scene record and return its id"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                cursor = self._conn.execute(
+                    "INSERT INTO scenes (owner, prompt, enhanced_prompt, timestamp, stored_bytes) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (owner, record["prompt"], record["enhanced_prompt"], record["timestamp"], len(record["scene"]))
+                )
+                scene_id = cursor.lastrowid
+                self._conn.execute(
+                    "INSERT INTO scene_blobs VALUES (?, ?, ?)",
+                    (scene_id, record["scene"], json.dumps(record["debug_info"], default=str))
+                )
+                if self.max_entries is not None:
+                    self._conn.execute(
+                        "DELETE FROM scenes WHERE owner = ? AND id NOT IN "
+                        "(SELECT id FROM scenes WHERE owner = ? ORDER BY id DESC LIMIT ?)",
+                        (owner, owner, self.max_entries)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return scene_id
+
+    def count(self, owner):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM scenes WHERE owner = ?", (owner,)).fetchone()[0]
+
+    def page(self, owner, offset=0, limit=10):
+        """Metadata of an owner's scenes, newest first, without the blobs"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, prompt, timestamp, stored_bytes FROM scenes "
+                "WHERE owner = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (owner, limit, offset)
+            ).fetchall()
+        return [
+            {"id": scene_id, "prompt": prompt, "timestamp": timestamp, "stored_bytes": stored_bytes}
+            for scene_id, prompt, timestamp, stored_bytes in rows
+        ]
+
+    def load(self, owner, scene_id):
+        """Full compact record of one scene, or None if the owner has no such scene"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT s.prompt, s.enhanced_prompt, s.timestamp, b.scene, b.debug_info "
+                "FROM scenes s JOIN scene_blobs b ON b.scene_id = s.id "
+                "WHERE s.id = ? AND s.owner = ?",
+                (scene_id, owner)
+            ).fetchone()
+        if row is None:
+            return None
+        prompt, enhanced_prompt, timestamp, scene, debug_info = row
+        return {
+            "id": scene_id,
+            "prompt": prompt,
+            "enhanced_prompt": enhanced_prompt,
+            "timestamp": timestamp,
+            "scene": bytes(scene),
+            "debug_info": json.loads(debug_info)
+        }
+
+    def delete(self, owner, scene_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM scenes WHERE id = ? AND owner = ?", (scene_id, owner))
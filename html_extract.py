@@ -0,0 +1,281 @@
+import re
+from bisect import bisect_left
+from threejs_runtime import THREE_JS_URL, ORBIT_CONTROLS_URL
+
+# Every boundary the extractor cares about, matched in one case-insensitive pass
+TOKEN_PATTERN = re.compile(r"<!doctype html>|<!doctype|<html|</html>|```", re.IGNORECASE)
+DOCTYPE_PATTERN = re.compile(r"<!doctype html>", re.IGNORECASE)
+HTML_OPEN_PATTERN = re.compile(r"<html", re.IGNORECASE)
+
+# A token split across two chunks is at most this long
+_TOKEN_OVERLAP = len("<!doctype html>") - 1
+
+
+class HtmlScanner:
+    """Single-pass, incremental scanner for HTML documents in model output.
+
+    ``feed`` records the position of every document and code-fence boundary
+    as text arrives, rescanning only the few characters that may hold a
+    token split across chunks. It returns the finished document as soon as
+    a ``</html>`` closes one, which is what streaming needs. ``extract``
+    applies the full preference order (DOCTYPE document, then bare
+    ``<html>`` document, then fenced code blocks) to everything fed so far.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._tail = ""
+        self.length = 0
+        self.doctype_start = None
+        self.doctype_end = None
+        self.html_start = None
+        self.html_end = None
+        self.fences = []
+        self.markers = []
+
+    @property
+    def text(self):
+        # Chunks are joined lazily, only when the text is actually needed
+        if len(self._parts) != 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0]
+
+    @property
+    def complete(self):
+        return self.doctype_end is not None or self.html_end is not None
+
+    @property
+    def document(self):
+        """The first closed document, or None while it is still arriving"""
+        text = self.text
+        if self.doctype_end is not None:
+            return text[self.doctype_start:self.doctype_end]
+        if self.html_end is not None:
+            return f"<!DOCTYPE html>\n{text[self.html_start:self.html_end]}"
+        return None
+
+    def feed(self, chunk):
+        """Scan a chunk and return the finished document once one has closed"""
+        if not chunk:
+            return self.document if self.complete else None
+        previous = self.length
+        tail = self._tail
+        window = tail + chunk if tail else chunk
+        self._parts.append(chunk)
+        self._tail = window[-_TOKEN_OVERLAP:]
+        self.length += len(chunk)
+
+        offset = previous - len(tail)
+        fences = self.fences
+        for match in TOKEN_PATTERN.finditer(window):
+            start, end = match.span()
+            if offset + end <= previous:
+                continue  # Already seen in the previous chunk
+            token = match.group()
+            if token[1] == "`":
+                fences.append(offset + start)
+            else:
+                self._record(token, offset + start, offset + end)
+        return self.document if self.complete else None
+
+    def _record(self, token, start, end):
+        kind = token[1]
+        if kind == "/":
+            if self.doctype_start is not None and self.doctype_end is None:
+                self.doctype_end = end
+            if self.html_start is not None and self.html_end is None:
+                self.html_end = end
+        else:
+            self.markers.append(start)
+            if kind == "!":
+                if len(token) > 9 and self.doctype_start is None:
+                    self.doctype_start = start
+            elif self.html_start is None:
+                self.html_start = start
+
+    def _code_block(self, text, index):
+        # Content bounds of the block opened by fence number ``index``, trimmed
+        # the way ```(?:html)?\s*(...)\s*``` would capture it
+        start = self.fences[index] + 3
+        if text.startswith("html", start):
+            start += 4
+        end = self.fences[index + 1]
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
+
+    def _marked_blocks(self):
+        # Fences pair up left to right, so a marker sits inside a block exactly
+        # when an odd number of fences precede it and a closing fence follows
+        seen = set()
+        paired = len(self.fences) - len(self.fences) % 2
+        for marker in self.markers:
+            index = bisect_left(self.fences, marker)
+            if index % 2 == 1 and index < paired and index not in seen:
+                seen.add(index)
+                yield index - 1
+
+    def extract(self):
+        """Best HTML document in everything fed so far"""
+        text = self.text
+        if self.doctype_end is not None:
+            return text[self.doctype_start:self.doctype_end]
+        if self.html_end is not None:
+            return f"<!DOCTYPE html>\n{text[self.html_start:self.html_end]}"
+
+        if len(self.fences) >= 2:
+            # Check each code block holding an HTML marker, in order
+            for index in self._marked_blocks():
+                start, end = self._code_block(text, index)
+                if DOCTYPE_PATTERN.match(text, start, end):
+                    return text[start:end]
+                if HTML_OPEN_PATTERN.match(text, start, end):
+                    return f"<!DOCTYPE html>\n{text[start:end]}"
+
+            # If no HTML found, use the first code block and wrap it
+            start, end = self._code_block(text, 0)
+            return wrap_script(text[start:end])
+
+        # Last resort - create a fallback scene
+        return create_fallback_scene()
+
+
+# Extract HTML from response
+def extract_html_from_response(response_text):
+    """Extract a complete HTML document from the response text"""
+    scanner = HtmlScanner()
+    scanner.feed(response_text)
+    return scanner.extract()
+
+# Wrap a bare script in a minimal Three.js page
+def wrap_script(code):
+    """Embed a code block in a page that loads Three.js and OrbitControls"""
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Generated 3D Scene</title>
+    <style>
+        body {{ margin: 0; overflow: hidden; }}
+        #info {{
+            position: absolute;
+            top: 10px;
+            width: 100%;
+            text-align: center;
+            color: white;
+            font-family: Arial, sans-serif;
+            pointer-events: none;
+            text-shadow: 1px 1px 1px black;
+        }}
+    </style>
+</head>
+<body>
+    <div id="info">Generated 3D Scene - Use mouse to navigate</div>
+    <script src="{THREE_JS_URL}"></script>
+    <script src="{ORBIT_CONTROLS_URL}"></script>
+    <script>
+    {code}
+    </script>
+</body>
+</html>"""
+
+# Fallback scene, built once with the pinned runtime URLs so post-processing leaves it unchanged
+FALLBACK_SCENE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Fallback 3D Scene</title>
+    <style>
+        body { margin: 0; overflow: hidden; }
+        #info {
+            position: absolute;
+            top: 10px;
+            width: 100%;
+            text-align: center;
+            color: white;
+            font-family: Arial, sans-serif;
+            pointer-events: none;
+            text-shadow: 1px 1px 1px black;
+        }
+        #error {
+            position: absolute;
+            bottom: 20px;
+            width: 100%;
+            text-align: center;
+            color: #ff4444;
+            font-family: Arial, sans-serif;
+            font-weight: bold;
+            pointer-events: none;
+            text-shadow: 1px 1px 1px black;
+        }
+    </style>
+</head>
+<body>
+    <div id="info">Fallback 3D Scene</div>
+    <div id="error">Scene generation failed - See debug info</div>
+    <script src="THREE_JS_URL"></script>
+    <script src="ORBIT_CONTROLS_URL"></script>
+    <script>
+    // Create a basic scene with an error message
+    const scene = new THREE.Scene();
+    scene.background = new THREE.Color(0x333344);
+    
+    const camera = new THREE.PerspectiveCamera(75, window.innerWidth / window.innerHeight, 0.1, 1000);
+    camera.position.set(0, 5, 10);
+    
+    const renderer = new THREE.WebGLRenderer({ antialias: true });
+    renderer.setSize(window.innerWidth, window.innerHeight);
+    document.body.appendChild(renderer.domElement);
+    
+    const controls = new THREE.OrbitControls(camera, renderer.domElement);
+    controls.enableDamping = true;
+    
+    // Add lights
+    const ambientLight = new THREE.AmbientLight(0x404040, 0.5);
+    scene.add(ambientLight);
+    
+    const directionalLight = new THREE.DirectionalLight(0xffffff, 1);
+    directionalLight.position.set(5, 10, 7.5);
+    scene.add(directionalLight);
+    
+    // Create a platform
+    const platformGeometry = new THREE.CylinderGeometry(5, 5, 0.5, 32);
+    const platformMaterial = new THREE.MeshPhongMaterial({ color: 0x888888 });
+    const platform = new THREE.Mesh(platformGeometry, platformMaterial);
+    platform.position.y = -0.25;
+    scene.add(platform);
+    
+    // Create error message cube
+    const cubeGeometry = new THREE.BoxGeometry(3, 3, 3);
+    const cubeMaterial = new THREE.MeshPhongMaterial({ color: 0xff4444 });
+    const cube = new THREE.Mesh(cubeGeometry, cubeMaterial);
+    cube.position.y = 1.5;
+    scene.add(cube);
+    
+    // Animation loop
+    function animate() {
+        requestAnimationFrame(animate);
+        cube.rotation.y += 0.01;
+        controls.update();
+        renderer.render(scene, camera);
+    }
+    animate();
+    
+    // Handle window resize
+    window.addEventListener('resize', function() {
+        camera.aspect = window.innerWidth / window.innerHeight;
+        camera.updateProjectionMatrix();
+        renderer.setSize(window.innerWidth, window.innerHeight);
+    });
+    </script>
+</body>
+</html>""".replace("THREE_JS_URL", THREE_JS_URL).replace("ORBIT_CONTROLS_URL", ORBIT_CONTROLS_URL)
+
+# Create a fallback scene if all else fails
+def create_fallback_scene():
+    """Create a basic fallback scene when extraction fails"""
+    return FALLBACK_SCENE
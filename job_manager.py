@@ -0,0 +1,117 @@
+import time
+import uuid
+import asyncio
+import threading
+
+# Job states, in the order a job moves through them
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """One background pipeline run and the state the UI polls"""
+
+    def __init__(self, owner, label):
+        self.id = uuid.uuid4().hex[:12]
+        self.owner = owner
+        self.label = label
+        self.status = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def snapshot(self):
+        """Plain-dict view of the job that is safe to hand to the UI thread"""
+        now = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "label": self.label,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "queued_s": round((self.started_at or now) - self.submitted_at, 2),
+            "elapsed_s": round(now - self.started_at, 2) if self.started_at else 0.0
+        }
+
+
+class JobManager:
+    """Runs generation jobs on the client loop independently of any script run.
+
+    ``submit`` returns a job id straight away; the job's coroutine is
+    scheduled on the ``ClientManager`` loop, at most ``max_concurrent`` at a
+    time, so it keeps running when the submitting page reruns, navigates
+    away or is refreshed. Jobs are grouped by owner for polling, and
+    finished jobs are forgotten after ``keep_finished`` seconds.
+    """
+
+    def __init__(self, client_manager, max_concurrent=4, keep_finished=3600):
+        self.client_manager = client_manager
+        self.max_concurrent = max_concurrent
+        self.keep_finished = keep_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._semaphore = None
+
+    def submit(self, owner, label, job_factory):
+        """Queue ``job_factory(progress)`` (a coroutine function) and return the job id"""
+        job = Job(owner, label)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.future = self.client_manager.submit(self._run(job, job_factory))
+        return job.id
+
+    async def _run(self, job, job_factory):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        async with self._semaphore:
+            job.status = RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = await job_factory(job.progress)
+                job.status = DONE
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+                job.status = FAILED
+            finally:
+                job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.snapshot() if job else None
+
+    def jobs(self, owner):
+        """Snapshots of an owner's jobs, newest first"""
+        with self._lock:
+            owned = [job for job in self._jobs.values() if job.owner == owner]
+        owned.sort(key=lambda job: job.submitted_at, reverse=True)
+        return [job.snapshot() for job in owned]
+
+    def active(self, owner):
+        """Number of an owner's jobs still queued or running"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.owner == owner and not job.finished)
+
+    def dismiss(self, owner, job_id):
+        """Forget a finished job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.owner == owner and job.finished:
+                del self._jobs[job_id]
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_finished
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
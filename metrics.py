@@ -0,0 +1,239 @@
+import os
+import time
+import atexit
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Export targets; both are off unless configured
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", "15"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Seconds; spans range from sub-millisecond post-processing rules to multi-minute generations
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (5, 10, 25, 50, 100, 200, 400, 800)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter, one series per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(key), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * len(self.buckets) + [0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def samples(self):
+        rows = []
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    rows.append((f"{self.name}_bucket", _format_labels(key, [("le", repr(float(bound)))]), count))
+                rows.append((f"{self.name}_bucket", _format_labels(key, [("le", "+Inf")]), series[-2]))
+                rows.append((f"{self.name}_sum", _format_labels(key), round(series[-1], 6)))
+                rows.append((f"{self.name}_count", _format_labels(key), series[-2]))
+        return rows
+
+
+class Registry:
+    """Process-wide set of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text):
+        metric = Counter(name, help_text)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Metrics recorded by the pipeline
+STAGE_SECONDS = REGISTRY.histogram("scene_stage_seconds", "Duration of each pipeline stage")
+PIPELINE_SECONDS = REGISTRY.histogram("scene_pipeline_seconds", "End-to-end generate_scene_from_prompt latency")
+UPSTREAM_REQUESTS = REGISTRY.counter("scene_upstream_requests_total", "Messages API responses by status")
+UPSTREAM_ERRORS = REGISTRY.counter("scene_upstream_errors_total", "Failed Messages API calls by status or error")
+TOKENS = REGISTRY.counter("scene_tokens_total", "Tokens reported by the Messages API")
+TOKENS_PER_SECOND = REGISTRY.histogram("scene_tokens_per_second", "Streamed output token rate", RATE_BUCKETS)
+CACHE_LOOKUPS = REGISTRY.counter("scene_cache_lookups_total", "Disk cache lookups by cache and outcome")
+SCENES = REGISTRY.counter("scene_results_total", "Finished pipeline runs by outcome")
+
+# Spans of the pipeline run in progress; asyncio tasks inherit it from their parent
+_current_trace = contextvars.ContextVar("scene_trace", default=None)
+
+
+def start_trace():
+    """Collect spans of the current task (and tasks it starts) into a new list"""
+    spans = []
+    _current_trace.set(spans)
+    return spans
+
+
+def record_span(stage, seconds, **attrs):
+    """Record a finished stage in the stage histogram and the current trace"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    spans = _current_trace.get()
+    if spans is not None:
+        spans.append(dict({"stage": stage, "ms": round(seconds * 1000, 3)}, **attrs))
+
+
+@contextmanager
+def span(stage, **attrs):
+    """Time the enclosed block as one pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record_span(stage, time.perf_counter() - started, **attrs)
+
+
+class ConnectionTrace:
+    """httpx ``trace`` extension recording connect, TLS and server wait spans.
+
+    Pass an instance as ``extensions={"trace": ConnectionTrace()}``; a
+    request on a pooled keep-alive connection records no connect span.
+    """
+
+    def __init__(self):
+        self._started = {}
+
+    async def __call__(self, event, info):
+        # Events look like "connection.connect_tcp.started" or "http11.receive_response_headers.complete"
+        step, _, phase = event.rpartition(".")
+        now = time.perf_counter()
+        if phase == "started":
+            self._started[step] = now
+        elif phase == "complete" and step in self._started:
+            seconds = now - self._started.pop(step)
+            if step.endswith("connect_tcp"):
+                record_span("connect", seconds)
+            elif step.endswith("start_tls"):
+                record_span("tls", seconds)
+            elif step.endswith("receive_response_headers"):
+                record_span("response_headers", seconds)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_metrics(path):
+    """Atomically write the current metrics to a file (for node_exporter's textfile collector)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(temporary, path)
+
+
+_exporter_started = False
+_exporter_lock = threading.Lock()
+
+
+def start_exporter(path=METRICS_FILE, host=METRICS_HOST, port=METRICS_PORT, interval=METRICS_FILE_INTERVAL):
+    """Serve /metrics on ``port`` and/or rewrite ``path`` every ``interval`` seconds, once per process"""
+    global _exporter_started
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+
+    if port:
+        try:
+            httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+            httpd.daemon_threads = True
+            threading.Thread(target=httpd.serve_forever, name="metrics-exporter", daemon=True).start()
+        except OSError:
+            # Port taken (e.g. by another app process); the file export still works
+            pass
+
+    if path:
+        def write_periodically():
+            while True:
+                time.sleep(interval)
+                write_metrics(path)
+        threading.Thread(target=write_periodically, name="metrics-file", daemon=True).start()
+        atexit.register(write_metrics, path)
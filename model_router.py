@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import random
+import threading
+from collections import deque
+from cache_store import CACHE_DIR
+from prompt_classifier import VOCABULARY, WORD
+
+# Model tiers per stage, fastest first; ROUTER_ENABLED=0 always uses the last (strongest) tier
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") != "0"
+ROUTER_ENHANCE_TIERS = os.getenv("ROUTER_ENHANCE_TIERS", "claude-3-haiku-20240307,claude-3-opus-20240229")
+ROUTER_GENERATE_TIERS = os.getenv("ROUTER_GENERATE_TIERS", "claude-3-5-sonnet-20240620,claude-3-opus-20240229")
+
+# Prompts at or above this complexity (0-1) get the strongest tier; above 1 never escalates
+ROUTER_ENHANCE_COMPLEXITY = float(os.getenv("ROUTER_ENHANCE_COMPLEXITY", "2"))
+ROUTER_GENERATE_COMPLEXITY = float(os.getenv("ROUTER_GENERATE_COMPLEXITY", "0.6"))
+
+# End-to-end latency objectives (seconds); a tier whose p90 exceeds its stage's SLO is skipped
+ROUTER_ENHANCE_SLO = float(os.getenv("ROUTER_ENHANCE_SLO", "15"))
+ROUTER_GENERATE_SLO = float(os.getenv("ROUTER_GENERATE_SLO", "120"))
+ROUTER_SLO_PERCENTILE = float(os.getenv("ROUTER_SLO_PERCENTILE", "90"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "10"))
+
+# Latency samples older than this (seconds) no longer count towards the SLO check
+ROUTER_SLO_WINDOW = float(os.getenv("ROUTER_SLO_WINDOW", "600"))
+
+# Fraction of SLO-demoted requests still sent to the strong tier, so its latency keeps being measured
+ROUTER_PROBE_RATE = float(os.getenv("ROUTER_PROBE_RATE", "0.05"))
+
+# Requests waiting on the governor before strong tiers are avoided
+ROUTER_MAX_QUEUE_DEPTH = int(os.getenv("ROUTER_MAX_QUEUE_DEPTH", "4"))
+
+# Decisions and their outcomes, one JSON object per line ("" disables)
+ROUTER_LOG = os.getenv("ROUTER_LOG", os.path.join(CACHE_DIR, "routing.jsonl"))
+
+
+def _tiers(value):
+    return [model.strip() for model in value.split(",") if model.strip()]
+
+
+class RecentLatencies:
+    """Latency samples of one model, with percentiles over the last ``window`` seconds"""
+
+    def __init__(self, window=ROUTER_SLO_WINDOW, maxlen=200):
+        self.window = window
+        self.samples = deque(maxlen=maxlen)
+
+    def add(self, seconds):
+        self.samples.append((time.monotonic(), seconds))
+
+    def recent(self):
+        cutoff = time.monotonic() - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return [seconds for _, seconds in self.samples]
+
+    def percentile(self, p):
+        values = sorted(self.recent())
+        if not values:
+            return None
+        return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def complexity(prompt):
+    """0-1 estimate of how demanding a scene is, from its length and how many objects and motions it names"""
+    words = WORD.findall(prompt.lower())
+    vocabulary = set(words)
+    objects = len(vocabulary & VOCABULARY["objects"])
+    animation = len(vocabulary & VOCABULARY["animation"])
+    return round(0.3 * min(len(words) / 250, 1.0) + 0.5 * min(objects / 8, 1.0) + 0.2 * min(animation / 4, 1.0), 3)
+
+
+class ModelRouter:
+    """Chooses the model of each request from per-stage tiers.
+
+    A stage starts on its fastest tier and escalates to the strongest one
+    for prompts at or above its complexity threshold. An escalation is
+    dropped again while the governor queue is deeper than
+    ``max_queue_depth``, or while the strong model's latency percentile
+    over the last ``slo_window`` seconds exceeds the stage's SLO. While
+    demoted for the SLO, ``probe_rate`` of those requests still go to the
+    strong model, so a recovered model is noticed and old samples age out
+    rather than pinning the demotion. Every decision is written to
+    ``log_path`` together with the outcome of the request it routed, for
+    tuning the thresholds offline.
+    """
+
+    def __init__(
+        self,
+        governor,
+        enabled=ROUTER_ENABLED,
+        max_queue_depth=ROUTER_MAX_QUEUE_DEPTH,
+        slo_percentile=ROUTER_SLO_PERCENTILE,
+        min_samples=ROUTER_MIN_SAMPLES,
+        slo_window=ROUTER_SLO_WINDOW,
+        probe_rate=ROUTER_PROBE_RATE,
+        log_path=ROUTER_LOG
+    ):
+        self.governor = governor
+        self.enabled = enabled
+        self.stages = {
+            "enhance": {
+                "tiers": _tiers(ROUTER_ENHANCE_TIERS),
+                "complexity": ROUTER_ENHANCE_COMPLEXITY,
+                "slo": ROUTER_ENHANCE_SLO
+            },
+            "generate": {
+                "tiers": _tiers(ROUTER_GENERATE_TIERS),
+                "complexity": ROUTER_GENERATE_COMPLEXITY,
+                "slo": ROUTER_GENERATE_SLO
+            }
+        }
+        self.max_queue_depth = max_queue_depth
+        self.slo_percentile = slo_percentile
+        self.min_samples = min_samples
+        self.slo_window = slo_window
+        self.probe_rate = probe_rate
+        self.log_path = log_path
+        self.latency = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def tracker(self, stage, model):
+        return self.latency.setdefault((stage, model), RecentLatencies(self.slo_window))
+
+    def models(self, stage):
+        """Every model a stage can be routed to, strongest first"""
+        return self.stages[stage]["tiers"][::-1]
+
+    def route(self, stage, prompt):
+        """Pick a model for one request of a stage and say why"""
+        policy = self.stages[stage]
+        tiers = policy["tiers"]
+        score = complexity(prompt)
+        queue_depth = self.governor.stats()["queue_depth"]
+        if not self.enabled or len(tiers) == 1:
+            tier, reason = len(tiers) - 1, "fixed"
+        elif score >= policy["complexity"]:
+            tier, reason = len(tiers) - 1, "complex"
+            with self._lock:
+                tracker = self.tracker(stage, tiers[tier])
+                latency = tracker.percentile(self.slo_percentile)
+                over_slo = len(tracker.samples) >= self.min_samples and latency > policy["slo"]
+            if queue_depth > self.max_queue_depth:
+                tier, reason = tier - 1, "queue"
+            elif over_slo and random.random() < self.probe_rate:
+                reason = "probe"
+            elif over_slo:
+                tier, reason = tier - 1, "slo"
+        else:
+            tier, reason = 0, "simple"
+        return {
+            "stage": stage,
+            "model": tiers[tier],
+            "tier": tier,
+            "reason": reason,
+            "complexity": score,
+            "queue_depth": queue_depth
+        }
+
+    def record(self, decision, outcome, latency, output_tokens=None, stop_reason=None):
+        """Record how a routed request went and append it to the decision log"""
+        with self._lock:
+            if outcome == "ok":
+                self.tracker(decision["stage"], decision["model"]).add(latency)
+            key = (decision["stage"], decision["model"], decision["reason"])
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if self.log_path:
+                entry = dict(
+                    decision,
+                    at=round(time.time(), 3),
+                    outcome=outcome,
+                    latency_s=round(latency, 3),
+                    output_tokens=output_tokens,
+                    stop_reason=stop_reason
+                )
+                directory = os.path.dirname(self.log_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "decisions": [
+                    {"stage": stage, "model": model, "reason": reason, "count": count}
+                    for (stage, model, reason), count in sorted(self.counts.items())
+                ],
+                "latency_percentile_s": {
+                    f"{stage}/{model}": round(percentile, 3)
+                    for (stage, model), tracker in self.latency.items()
+                    for percentile in [tracker.percentile(self.slo_percentile)] if percentile is not None
+                }
+            }
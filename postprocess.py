@@ -0,0 +1,305 @@
+import re
+import time
+from threejs_runtime import THREE_JS_URL, ORBIT_CONTROLS_URL
+
+# Lion built from primitives, injected when a scene tried to load a model
+PRIMITIVE_LION_SCRIPT = """
+    <script>
+        // Alert about external model attempt
+        console.warn("External model loading detected and removed. Using primitive shapes instead.");
+        
+        // Create lion using primitives
+        function createLion() {
+            const lionGroup = new THREE.Group();
+            
+            // Body
+            const bodyGeometry = new THREE.SphereGeometry(1, 16, 16);
+            const bodyMaterial = new THREE.MeshStandardMaterial({ color: 0xC2B280 });
+            const body = new THREE.Mesh(bodyGeometry, bodyMaterial);
+            body.scale.set(1.2, 1, 1.5);
+            body.position.y = 1.1;
+            body.castShadow = true;
+            lionGroup.add(body);
+            
+            // Head
+            const headGeometry = new THREE.SphereGeometry(0.7, 16, 16);
+            const headMaterial = new THREE.MeshStandardMaterial({ color: 0xC2B280 });
+            const head = new THREE.Mesh(headGeometry, headMaterial);
+            head.position.set(1.2, 1.5, 0);
+            head.castShadow = true;
+            lionGroup.add(head);
+            
+            // Mane
+            const maneGeometry = new THREE.SphereGeometry(1, 16, 16);
+            const maneMaterial = new THREE.MeshStandardMaterial({ color: 0xCD853F });
+            const mane = new THREE.Mesh(maneGeometry, maneMaterial);
+            mane.position.set(1.2, 1.5, 0);
+            mane.scale.set(1.2, 1.2, 1.2);
+            mane.castShadow = true;
+            lionGroup.add(mane);
+            
+            // Face
+            const snoutGeometry = new THREE.CylinderGeometry(0.2, 0.3, 0.4, 8);
+            const snoutMaterial = new THREE.MeshStandardMaterial({ color: 0xD2B48C });
+            const snout = new THREE.Mesh(snoutGeometry, snoutMaterial);
+            snout.position.set(1.7, 1.4, 0);
+            snout.rotation.z = Math.PI / 2;
+            snout.castShadow = true;
+            lionGroup.add(snout);
+            
+            // Eyes
+            const eyeGeometry = new THREE.SphereGeometry(0.1, 8, 8);
+            const eyeMaterial = new THREE.MeshStandardMaterial({ color: 0x000000 });
+            
+            const leftEye = new THREE.Mesh(eyeGeometry, eyeMaterial);
+            leftEye.position.set(1.6, 1.7, 0.3);
+            lionGroup.add(leftEye);
+            
+            const rightEye = new THREE.Mesh(eyeGeometry, eyeMaterial);
+            rightEye.position.set(1.6, 1.7, -0.3);
+            lionGroup.add(rightEye);
+            
+            // Legs
+            const legGeometry = new THREE.CylinderGeometry(0.2, 0.2, 1, 8);
+            const legMaterial = new THREE.MeshStandardMaterial({ color: 0xC2B280 });
+            
+            const frontLeftLeg = new THREE.Mesh(legGeometry, legMaterial);
+            frontLeftLeg.position.set(0.6, 0.5, 0.5);
+            frontLeftLeg.castShadow = true;
+            lionGroup.add(frontLeftLeg);
+            
+            const frontRightLeg = new THREE.Mesh(legGeometry, legMaterial);
+            frontRightLeg.position.set(0.6, 0.5, -0.5);
+            frontRightLeg.castShadow = true;
+            lionGroup.add(frontRightLeg);
+            
+            const backLeftLeg = new THREE.Mesh(legGeometry, legMaterial);
+            backLeftLeg.position.set(-0.6, 0.5, 0.5);
+            backLeftLeg.castShadow = true;
+            lionGroup.add(backLeftLeg);
+            
+            const backRightLeg = new THREE.Mesh(legGeometry, legMaterial);
+            backRightLeg.position.set(-0.6, 0.5, -0.5);
+            backRightLeg.castShadow = true;
+            lionGroup.add(backRightLeg);
+            
+            // Tail
+            const tailGeometry = new THREE.CylinderGeometry(0.1, 0.15, 1.5, 8);
+            const tailMaterial = new THREE.MeshStandardMaterial({ color: 0xC2B280 });
+            const tail = new THREE.Mesh(tailGeometry, tailMaterial);
+            tail.position.set(-1.5, 1.2, 0);
+            tail.rotation.z = Math.PI / 4;
+            tail.castShadow = true;
+            lionGroup.add(tail);
+            
+            // Tail tuft
+            const tuftGeometry = new THREE.SphereGeometry(0.2, 8, 8);
+            const tuftMaterial = new THREE.MeshStandardMaterial({ color: 0x8B4513 });
+            const tuft = new THREE.Mesh(tuftGeometry, tuftMaterial);
+            tuft.position.set(-2, 1.8, 0);
+            tuft.castShadow = true;
+            lionGroup.add(tuft);
+            
+            // Position the lion
+            lionGroup.position.set(-2, 0, 0);
+            scene.add(lionGroup);
+            
+            return lionGroup;
+        }
+        
+        const lion = createLion();
+        let animateLion = function(time) {
+            // Animate lion (subtle breathing)
+            lion.children[0].scale.y = 1 + Math.sin(time * 3) * 0.05;
+            lion.children[2].scale.y = 1 + Math.sin(time * 3) * 0.05;
+            
+            // Animate tail
+            lion.children[9].rotation.z = Math.PI / 4 + Math.sin(time * 2) * 0.2;
+            lion.children[10].position.x = -2 + Math.sin(time * 2) * 0.1;
+            lion.children[10].position.y = 1.8 + Math.sin(time * 2) * 0.1;
+        };
+        
+        // Update the animation function to include lion animation
+        const originalAnimateFunction = animate;
+        animate = function() {
+            let time = Date.now() * 0.001;
+            if (typeof animateLion === 'function') {
+                animateLion(time);
+            }
+            originalAnimateFunction();
+        };
+    </script>
+</body>"""
+
+
+class TransformPipeline:
+    """Regex rewrite rules fused into a single scan and a single output build.
+
+    Rules are registered once and compiled into one alternation, so adding a
+    rule does not add another pass over the document. A rule without a
+    replacement is a marker: it is only counted. A rule with ``requires``
+    is applied only if one of the named rules matched somewhere in the
+    document, which covers rewrites that depend on what else the page
+    contains. Patterns are joined into one alternation without wrapping
+    groups, so when every rule starts with a literal character the regex
+    engine can skip straight to candidate positions.
+    """
+
+    def __init__(self):
+        self.rules = []
+        self._compiled = []
+        self._pattern = None
+
+    def register(self, name, pattern, replacement=None, requires=None):
+        """Add a rule; ``replacement`` may be a string or a callable taking the match text"""
+        self.rules.append({
+            "name": name,
+            "pattern": pattern,
+            "replacement": replacement,
+            "requires": tuple(requires) if requires else None
+        })
+        self._pattern = None
+        return self
+
+    def compile(self):
+        self._compiled = [re.compile(rule["pattern"]) for rule in self.rules]
+        self._pattern = re.compile("|".join(rule["pattern"] for rule in self.rules))
+        return self
+
+    def _rule_at(self, text, start):
+        # The alternation takes the first rule that matches at a position
+        for index, pattern in enumerate(self._compiled):
+            if pattern.match(text, start):
+                return index
+        raise AssertionError("fused pattern matched no individual rule")
+
+    def apply(self, text):
+        """Return the rewritten text and per-rule hit counts and timings"""
+        if self._pattern is None:
+            self.compile()
+
+        started = time.perf_counter()
+        matches = [(self._rule_at(text, m.start()), m.start(), m.end()) for m in self._pattern.finditer(text)]
+        scanned = time.perf_counter()
+
+        hits = [0] * len(self.rules)
+        for index, _, _ in matches:
+            hits[index] += 1
+        names = {rule["name"]: hits[i] for i, rule in enumerate(self.rules)}
+        active = [
+            rule["replacement"] is not None
+            and (rule["requires"] is None or any(names.get(name) for name in rule["requires"]))
+            for rule in self.rules
+        ]
+
+        # Stitch unchanged spans and replacements together in one join
+        timings = [0.0] * len(self.rules)
+        pieces = []
+        position = 0
+        for index, start, end in matches:
+            if not active[index]:
+                continue
+            rule_started = time.perf_counter()
+            replacement = self.rules[index]["replacement"]
+            if callable(replacement):
+                replacement = replacement(text[start:end])
+            pieces.append(text[position:start])
+            pieces.append(replacement)
+            position = end
+            timings[index] += time.perf_counter() - rule_started
+        if pieces:
+            pieces.append(text[position:])
+            text = "".join(pieces)
+        finished = time.perf_counter()
+
+        stats = {
+            "scan_ms": round((scanned - started) * 1000, 3),
+            "build_ms": round((finished - scanned) * 1000, 3),
+            "rules": {
+                rule["name"]: {
+                    "hits": hits[i],
+                    "applied": active[i] and hits[i] > 0,
+                    "time_ms": round(timings[i] * 1000, 3)
+                }
+                for i, rule in enumerate(self.rules)
+            }
+        }
+        return text, stats
+
+
+# Any version on any CDN, with or without a scheme
+_VERSION = r"(?:@[^/\"'\s]+)?"
+_CDN_THREE = (
+    r"//(?:unpkg\.com/three" + _VERSION + r"/build"
+    r"|cdn\.jsdelivr\.net/npm/three" + _VERSION + r"/build"
+    r"|cdnjs\.cloudflare\.com/ajax/libs/three\.js/[^/\"'\s]+"
+    r"|threejs\.org/build)/three(?:\.min)?\.js"
+)
+_CDN_ORBIT_CONTROLS = (
+    r"//(?:unpkg\.com/three" + _VERSION + r"/examples/js/controls"
+    r"|cdn\.jsdelivr\.net/npm/three" + _VERSION + r"/examples/js/controls"
+    r"|cdnjs\.cloudflare\.com/ajax/libs/three\.js/[^/\"'\s]+/controls"
+    r"|threejs\.org/examples/js/controls)/OrbitControls(?:\.min)?\.js"
+)
+
+
+def _any_scheme(pattern):
+    # Two literal-prefixed alternatives instead of an optional scheme group
+    return f"https?:{pattern}|{pattern}"
+
+# Point every CDN copy of Three.js at the pinned runtime the app serves
+def register_cdn_rules(pipeline):
+    pipeline.register("cdn_three", _any_scheme(_CDN_THREE), THREE_JS_URL)
+    pipeline.register("cdn_orbit_controls", _any_scheme(_CDN_ORBIT_CONTROLS), ORBIT_CONTROLS_URL)
+    return pipeline
+
+# Longest stretch each part of a loader block may span; keeps blocks that never reach
+# loader.load() from scanning to the end of the document
+_GLTF_BLOCK_SPAN = 1000
+
+# Remove GLTFLoader and model loading, substituting a primitive lion
+def register_gltf_rules(pipeline):
+    model_rules = ("gltf_loader_block", "gltf_reference", "model_load_call")
+    pipeline.register(
+        "gltf_loader_script",
+        r'<script src="[^"]*GLTFLoader[^"]*"><\/script>',
+        ""
+    )
+    pipeline.register(
+        "gltf_loader_block",
+        r"const loader = new THREE\.GLTFLoader\(\);"
+        r"[\s\S]{0,%d}?loader\.load\([^\)]{0,%d}\)[^\}]{0,%d}\}\);" % ((_GLTF_BLOCK_SPAN,) * 3),
+        "// External model loading removed"
+    )
+    pipeline.register("gltf_reference", r"GLTFLoader")
+    pipeline.register("model_load_call", r"loader\.load\(")
+    pipeline.register("inject_primitive_lion", r"</body>", PRIMITIVE_LION_SCRIPT, requires=model_rules)
+    return pipeline
+
+
+def build_pipeline(*rule_groups):
+    pipeline = TransformPipeline()
+    for register_rules in rule_groups:
+        register_rules(pipeline)
+    return pipeline.compile()
+
+
+CDN_PIPELINE = build_pipeline(register_cdn_rules)
+GLTF_PIPELINE = build_pipeline(register_gltf_rules)
+POSTPROCESS_PIPELINE = build_pipeline(register_cdn_rules, register_gltf_rules)
+
+
+# Fix CDN URLs to use the pinned Three.js runtime
+def fix_cdn_urls(html_content):
+    """Replace any Three.js CDN URL with the pinned runtime reference"""
+    return CDN_PIPELINE.apply(html_content)[0]
+
+# Remove GLTF loader and model loading
+def remove_gltf_loader(html_content):
+    """Remove GLTFLoader and model loading from the HTML"""
+    return GLTF_PIPELINE.apply(html_content)[0]
+
+# Every post-processing rule in one pass
+def postprocess_html(html_content):
+    """Apply all registered sanitizers, returning the HTML and per-rule stats"""
+    return POSTPROCESS_PIPELINE.apply(html_content)
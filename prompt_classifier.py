@@ -0,0 +1,110 @@
+import re
+import math
+import threading
+from collections import Counter
+
+# Vocabulary an enhanced scene description usually covers
+VOCABULARY = {
+    "objects": {
+        "box", "cube", "sphere", "cylinder", "cone", "plane", "torus", "ring", "geometry",
+        "primitive", "primitives", "mesh", "building", "buildings", "tree", "trees", "ground",
+        "terrain", "water", "sky", "car", "cars", "road", "roads", "house", "mountain",
+        "mountains", "grass", "rock", "rocks", "cloud", "clouds", "planet", "planets"
+    },
+    "lighting": {
+        "light", "lights", "lighting", "lit", "shadow", "shadows", "sun", "sunlight", "glow",
+        "glowing", "ambient", "directional", "spotlight", "night", "day", "dusk", "dawn",
+        "sunset", "fog", "atmosphere", "atmospheric", "illuminate", "illuminated", "bright", "dim"
+    },
+    "animation": {
+        "animate", "animated", "animation", "animations", "rotate", "rotating", "rotation",
+        "move", "moving", "movement", "orbit", "orbiting", "sway", "swaying", "spin",
+        "spinning", "bounce", "bouncing", "fly", "flying", "drift", "drifting", "flow",
+        "flowing", "cycle", "walk", "walking", "float", "floating", "pulse", "pulsing"
+    },
+    "camera": {
+        "camera", "controls", "orbitcontrols", "view", "views", "perspective", "zoom", "pan",
+        "angle", "angles", "explore", "navigate", "interactive"
+    },
+    "materials": {
+        "color", "colors", "colour", "colours", "colored", "material", "materials", "texture",
+        "metallic", "shiny", "matte", "transparent", "golden", "red", "green", "blue", "yellow",
+        "white", "black", "brown", "orange", "purple", "gray", "grey", "tawny"
+    }
+}
+
+MIN_WORDS = 60
+TARGET_WORDS = 150
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def _words(text):
+    return WORD.findall(text.lower())
+
+
+def _cosine(a, b):
+    dot = sum(count * b.get(word, 0) for word, count in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+class EnhancementBypass:
+    """Offline classifier deciding when a prompt is already detailed enough.
+
+    A prompt is scored on its length, how many vocabulary categories it
+    covers and how close its wording is to the enhanced example
+    descriptions; prompts scoring at or above ``threshold`` skip
+    ``enhance_prompt``. Decisions and enhancement latencies are tallied so
+    each request can report the bypass rate and the time it saved.
+    """
+
+    def __init__(self, examples, threshold=0.7):
+        self.threshold = threshold
+        self.style = Counter()
+        for example in examples:
+            self.style.update(_words(example["enhanced"]))
+        self.checked = 0
+        self.bypassed = 0
+        self.enhance_seconds = 0.0
+        self.enhance_calls = 0
+        self._lock = threading.Lock()
+
+    def record_enhance_latency(self, seconds):
+        with self._lock:
+            self.enhance_seconds += seconds
+            self.enhance_calls += 1
+
+    def assess(self, prompt):
+        """Score a prompt and decide whether enhancement can be skipped"""
+        words = _words(prompt)
+        vocabulary = set(words)
+        coverage = {
+            category: len(vocabulary & terms)
+            for category, terms in VOCABULARY.items()
+        }
+        covered = sum(1 for hits in coverage.values() if hits) / len(VOCABULARY)
+        length = min(len(words) / TARGET_WORDS, 1.0)
+        style = _cosine(Counter(words), self.style)
+
+        score = 0.4 * length + 0.4 * covered + 0.2 * min(style / 0.5, 1.0)
+        bypass = len(words) >= MIN_WORDS and score >= self.threshold
+
+        with self._lock:
+            self.checked += 1
+            if bypass:
+                self.bypassed += 1
+            average_enhance = self.enhance_seconds / self.enhance_calls if self.enhance_calls else None
+            bypass_rate = self.bypassed / self.checked
+
+        return {
+            "bypassed": bypass,
+            "score": round(score, 3),
+            "features": {
+                "words": len(words),
+                "coverage": coverage,
+                "style_similarity": round(style, 3)
+            },
+            "estimated_latency_saved_s": round(average_enhance, 2) if bypass and average_enhance else 0.0,
+            "bypass_rate": round(bypass_rate, 3)
+        }
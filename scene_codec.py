@@ -0,0 +1,59 @@
+import re
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# One-byte codec tags at the start of every packed scene
+ZLIB_TAG = b"z"
+ZSTD_TAG = b"s"
+
+HTML_COMMENT = re.compile(r"<!--(?!\[if)[\s\S]*?-->")
+JS_LINE_COMMENT = re.compile(r"^[ \t]*//[^\n]*\n", re.MULTILINE)
+INDENTATION = re.compile(r"^[ \t]+|[ \t]+$", re.MULTILINE)
+BLANK_LINES = re.compile(r"\n{2,}")
+
+
+def minify_html(html_content):
+    """Drop comments, indentation and blank lines without touching code on the line.
+
+    Only whole-line ``//`` comments are removed, so URLs and comment-like
+    text inside strings survive.
+    """
+    html_content = HTML_COMMENT.sub("", html_content)
+    html_content = JS_LINE_COMMENT.sub("", html_content)
+    html_content = INDENTATION.sub("", html_content)
+    return BLANK_LINES.sub("\n", html_content).strip()
+
+
+def pack_scene(html_content):
+    """Minify and compress a scene; returns the blob and its size report"""
+    minified = minify_html(html_content)
+    raw = minified.encode("utf-8")
+    if zstandard is not None:
+        blob = ZSTD_TAG + zstandard.ZstdCompressor(level=19).compress(raw)
+        codec = "zstd"
+    else:
+        blob = ZLIB_TAG + zlib.compress(raw, 9)
+        codec = "zlib"
+
+    original_bytes = len(html_content.encode("utf-8"))
+    return blob, {
+        "codec": codec,
+        "raw_bytes": original_bytes,
+        "served_bytes": len(raw),
+        "stored_bytes": len(blob),
+        "ratio": round(original_bytes / len(blob), 1)
+    }
+
+
+def unpack_scene(blob):
+    """Decompress a packed scene back to its (minified) HTML"""
+    tag, payload = blob[:1], blob[1:]
+    if tag == ZSTD_TAG:
+        if zstandard is None:
+            raise RuntimeError("Scene was packed with zstd but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+    return zlib.decompress(payload).decode("utf-8")
@@ -0,0 +1,774 @@
+import os
+import time
+import asyncio
+import functools
+import httpx
+from contextlib import aclosing
+from datetime import datetime
+from api_client import get_client_manager
+from cache_store import CACHE_DIR, DiskCache, normalize_prompt, hash_text, make_key
+from similarity_index import PromptIndex
+from prompt_classifier import EnhancementBypass
+from example_library import EXAMPLES_DIR, ExampleLibrary
+from html_extract import HtmlScanner, extract_html_from_response, create_fallback_scene
+from postprocess import fix_cdn_urls, postprocess_html
+from scene_codec import pack_scene, unpack_scene
+from single_flight import SingleFlight
+from hedging import Hedger
+from token_budget import TokenBudget, prompt_class
+from model_router import ModelRouter
+from metrics import PIPELINE_SECONDS, SCENES, TOKENS_PER_SECOND, record_span, span, start_exporter, start_trace
+
+# Scene generation engine shared by the Streamlit app and the batch CLI.
+# Everything here is built once per process on import and holds no UI state.
+
+# Prometheus metrics endpoint/file, when METRICS_PORT or METRICS_FILE is set
+start_exporter()
+
+# Shared HTTP client for every caller in the process, warmed up on import
+api_client = get_client_manager()
+api_client.warm_up()
+
+# Persistent cache of enhanced prompts, shared by all sessions
+enhance_cache = DiskCache(
+    os.path.join(CACHE_DIR, "enhance.sqlite3"),
+    max_entries=int(os.getenv("ENHANCE_CACHE_MAX_ENTRIES", "5000")),
+    ttl=float(os.getenv("ENHANCE_CACHE_TTL", str(30 * 24 * 3600)))
+)
+
+# Content-addressed cache of finished scenes, bounded by total size
+scene_cache = DiskCache(
+    os.path.join(CACHE_DIR, "scenes.sqlite3"),
+    max_bytes=int(os.getenv("SCENE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+)
+
+# Near-duplicate index mapping past prompts to their cached scenes
+prompt_index = PromptIndex(
+    os.path.join(CACHE_DIR, "prompts.sqlite3"),
+    threshold=float(os.getenv("SIMILAR_PROMPT_THRESHOLD", "0.75"))
+)
+
+# Bump whenever extraction or post-processing changes the produced HTML
+POSTPROCESS_VERSION = 3
+
+# Reference scenes, indexed once per process
+example_library = ExampleLibrary.load()
+
+# Few-shot mappings used by the enhancement prompt
+EXAMPLE_MAPPINGS = example_library.featured()
+
+# Demo scene shown next to the generator
+with open(os.path.join(EXAMPLES_DIR, "solar_system.html"), encoding="utf-8") as f:
+    SOLAR_SYSTEM_HTML = fix_cdn_urls(f.read().strip())
+
+# Number of reference scenes embedded in each generation prompt
+GENERATION_EXAMPLE_COUNT = int(os.getenv("GENERATION_EXAMPLE_COUNT", "1"))
+
+# max_tokens and timeouts per prompt class, tightened from observed responses
+token_budget = TokenBudget({
+    "enhance": {"max_tokens": 750, "timeout": 45.0, "min_tokens": 400, "min_timeout": 10.0},
+    "generate": {"max_tokens": 4000, "timeout": 180.0, "min_tokens": 2000, "min_timeout": 30.0}
+})
+
+# Model tier of each request, by stage, prompt complexity, queue depth and latency SLO
+model_router = ModelRouter(api_client.governor)
+
+# Enhancement system prompt with the few-shot examples, built once per process
+def build_enhance_system_prompt(examples):
+    """System prompt for enhance_prompt with explicit simple-to-enhanced examples"""
+    example_text = ""
+    for example in examples:
+        example_text += f"SIMPLE: \"{example['simple']}\"\n"
+        example_text += f"ENHANCED: \"{example['enhanced']}\"\n\n"
+    
+    return f"""You transform simple scene descriptions into detailed specifications for 3D visualization.
+
+Here are examples of the exact transformation expected:
+
+{example_text}
+Your job is to transform the user's simple prompt into a similar enhanced description that describes:
+1. Core visual elements with specific details (shapes, sizes, colors)
+2. Movement and animations that bring the scene to life
+3. Lighting and atmospheric effects
+4. Interactive elements where appropriate
+5. Spatial relationships between objects
+
+CRITICALLY IMPORTANT: Always specify that objects should be created using only THREE.js primitive shapes (boxes, spheres, cylinders, etc.) and NOT using external 3D models or resources.
+
+The enhanced description should be 150-250 words and focus entirely on what should appear in the scene."""
+
+ENHANCE_SYSTEM_PROMPT = build_enhance_system_prompt(EXAMPLE_MAPPINGS)
+ENHANCE_SYSTEM_PROMPT_HASH = hash_text(ENHANCE_SYSTEM_PROMPT)
+
+# Enhanced prompt function using explicit examples
+async def enhance_prompt(basic_prompt):
+    """Transform a basic prompt into a detailed scene description"""
+    budget_class = prompt_class("enhance", basic_prompt)
+    budget = token_budget.budget(budget_class)
+    routing = model_router.route("enhance", basic_prompt)
+    data = {
+        "model": routing["model"],
+        "max_tokens": budget["max_tokens"],
+        "temperature": 0.3,
+        "system": ENHANCE_SYSTEM_PROMPT,
+        "messages": [
+            {"role": "user", "content": f"""Transform this simple description:
+
+"{basic_prompt}"
+
+Into a detailed scene description similar to the examples in your instructions.
+Focus only on what should appear in the scene and how it should behave.
+IMPORTANT: Specify that all objects must be created using THREE.js primitive shapes (boxes, spheres, cylinders, etc.) and NOT using external 3D models."""}
+        ]
+    }
+    
+    # Serve identical (after normalization) requests from the cache
+    cache_key = make_key(
+        "enhance",
+        normalize_prompt(basic_prompt),
+        data["model"],
+        data["temperature"],
+        ENHANCE_SYSTEM_PROMPT_HASH
+    )
+    cached = enhance_cache.get(cache_key)
+    if cached is not None:
+        return cached, None
+    
+    started = time.perf_counter()
+    try:
+        with span("enhance_request"):
+            response = await api_client.post_messages(data, timeout=budget["timeout"])
+    except httpx.HTTPError as e:
+        model_router.record(routing, type(e).__name__, time.perf_counter() - started)
+        if not isinstance(e, httpx.TimeoutException):
+            raise
+        # A learned timeout can be tighter than the old fixed one; generate from the raw prompt instead of failing
+        token_budget.record_timeout(budget_class)
+        return basic_prompt, "Timeout"
+    
+    if response.status_code != 200:
+        model_router.record(routing, f"http_{response.status_code}", response.elapsed.total_seconds())
+        return basic_prompt, f"Error: {response.status_code}"
+    
+    response_data = response.json()
+    output_tokens = response_data.get("usage", {}).get("output_tokens", 0)
+    stop_reason = response_data.get("stop_reason")
+    token_budget.record(budget_class, "request", output_tokens, stop_reason, response.elapsed.total_seconds())
+    model_router.record(routing, "ok", response.elapsed.total_seconds(), output_tokens, stop_reason)
+    
+    if "content" in response_data and len(response_data["content"]) > 0:
+        enhanced_prompt = response_data["content"][0]["text"]
+        enhance_cache.set(cache_key, enhanced_prompt)
+        return enhanced_prompt, None
+    else:
+        return basic_prompt, "No content in response"
+
+# Reference scenes by id, for building generation prompts
+examples_by_id = {example["id"]: example for example in example_library.examples}
+
+# Generation system prompt for a set of reference scenes, built once per combination
+@functools.lru_cache(maxsize=None)
+def generation_system_prompt(example_ids):
+    """System prompt for generate_scene embedding the full mapping of each reference scene"""
+    example_text = ""
+    for example_id in example_ids:
+        example = examples_by_id[example_id]
+        example_text += f"""SIMPLE PROMPT: "{example['simple']}"
+
+ENHANCED DESCRIPTION: "{example['enhanced']}"
+
+WORKING HTML: {example['html']}
+
+"""
+    
+    return f"""You are an expert Three.js developer who creates complete, working 3D web applications.
+
+I'll provide you with a description of a 3D scene. Your task is to generate a SINGLE, COMPLETE HTML file containing a Three.js scene that implements this description.
+
+CRITICALLY IMPORTANT: DO NOT USE EXTERNAL 3D MODELS OR RESOURCES. Create all scene elements using Three.js primitive shapes like BoxGeometry, SphereGeometry, CylinderGeometry, etc.
+
+Here's an example of the transformation from simple prompt to enhanced description to working HTML:
+
+{example_text}You will be given a new description to build. Your output must:
+1. Be a COMPLETE HTML document with all necessary Three.js imports
+2. Use unpkg.com CDN links for Three.js (version 0.137.0 or newer)
+3. Include OrbitControls for camera navigation
+4. Have proper lighting, shadows, and camera setup
+5. Implement animations that bring the scene to life
+6. Create ALL objects using Three.js primitive shapes (NOT GLTFLoader or other model loaders)
+7. Include a help message in a #info div to guide users
+8. Ensure all code is properly closed and browsers will render the scene correctly
+
+RETURN ONLY THE COMPLETE HTML DOCUMENT."""
+
+# Scene generator with improved template approach
+async def generate_scene(prompt, simple_prompt, stream=False, progress=None, regenerate=False):
+    """Generate a complete Three.js scene from a prompt"""
+    # Rank the reference scenes by relevance to the user's prompt
+    ranked = example_library.best_matches(simple_prompt, k=GENERATION_EXAMPLE_COUNT)
+    example_ids = [example["id"] for example, _ in ranked]
+    
+    system_prompt = generation_system_prompt(tuple(example_ids))
+    
+    budget_class = prompt_class("generate", prompt)
+    budget = token_budget.budget(budget_class, "stream" if stream else "request")
+    temperature = 0.2
+    debug_info = {
+        "request": {
+            "simple_prompt": simple_prompt,
+            "enhanced_prompt": prompt,
+            "system_prompt_length": len(system_prompt),
+            "examples": [{"id": example["id"], "score": score} for example, score in ranked],
+            "model": None,
+            "max_tokens": budget["max_tokens"],
+            "temperature": temperature
+        },
+        "budget": dict(budget, prompt_class=budget_class),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    
+    # Identical requests reuse the finished scene unless a regeneration is asked for
+    def scene_cache_key(model):
+        return make_key("scene", prompt, example_ids, model, temperature, POSTPROCESS_VERSION)
+    
+    if regenerate:
+        debug_info["scene_cache"] = "bypass"
+    else:
+        # Looked up before routing, strongest tier first: under load a complex prompt is routed to a
+        # cheaper model, and must still hit the scene it already has from the strong one
+        with span("scene_cache_lookup"):
+            for model in model_router.models("generate"):
+                cached = scene_cache.get(scene_cache_key(model))
+                if cached is not None:
+                    cached = unpack_scene(cached)
+                    break
+        if cached is not None:
+            debug_info["request"]["model"] = model
+            debug_info["scene_cache_key"] = scene_cache_key(model)
+            debug_info["scene_cache"] = "hit"
+            debug_info["html_length"] = len(cached)
+            return cached, debug_info
+        debug_info["scene_cache"] = "miss"
+    
+    routing = model_router.route("generate", prompt)
+    data = {
+        "model": routing["model"],
+        "max_tokens": budget["max_tokens"],
+        "temperature": temperature,
+        # The system prompt only depends on the chosen example, so it is sent as
+        # a cache-marked prefix and just the user message changes between calls
+        "system": [
+            {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+        ],
+        "messages": [
+            {"role": "user", "content": f"""Create a complete, working Three.js scene based on this description:
+
+{prompt}
+
+Generate ONLY a complete HTML document with embedded JavaScript. Your HTML must include:
+1. Proper <head> section with viewport settings and styles
+2. Three.js and OrbitControls imported from unpkg.com (not CloudFlare)
+3. A complete scene setup with proper lighting
+4. Animated elements to bring the scene to life
+5. A help message in a #info div for users
+6. Responsive design that works on all screen sizes
+7. Create ALL objects using Three.js primitive shapes (NO EXTERNAL MODELS)
+
+DO NOT use GLTFLoader or try to load external 3D models. Build all scene elements directly using Three.js geometry.
+
+Your response should start with <!DOCTYPE html> and end with </html>."""}
+        ]
+    }
+    
+    debug_info["request"]["model"] = data["model"]
+    debug_info["routing"] = routing
+    cache_key = scene_cache_key(data["model"])
+    debug_info["scene_cache_key"] = cache_key
+    
+    # Each attempt gets its own debug info and progress so a hedge cannot clobber the primary;
+    # callers that pass no progress (the batch CLI, request mode) still get a private dict here
+    attempt_progress = [progress if progress is not None else {}, {}]
+    def attempt(index, first_output):
+        if stream:
+            return stream_scene(data, dict(debug_info), attempt_progress[index], first_output)
+        return request_scene(data, dict(debug_info), first_output)
+    
+    started = time.perf_counter()
+    try:
+        (html_content, debug_info), hedge = await hedger.run(
+            "stream" if stream else "request",
+            attempt,
+            lambda result: result[0] is not None
+        )
+    except Exception as e:
+        model_router.record(routing, type(e).__name__, time.perf_counter() - started)
+        raise
+    response_meta = debug_info.get("response_meta", {})
+    usage = response_meta.get("usage", {})
+    if html_content:
+        outcome = "ok"
+    elif debug_info.get("status_code", 200) != 200:
+        outcome = f"http_{debug_info['status_code']}"
+    else:
+        outcome = "failed"
+    model_router.record(
+        routing,
+        outcome,
+        time.perf_counter() - started,
+        usage.get("output_tokens", usage.get("output_tokens_estimated")),
+        response_meta.get("stop_reason")
+    )
+    if hedge["fired"]:
+        # Output tokens the losing attempt had already generated
+        loser = attempt_progress[1 if hedge["winner"] == "primary" else 0]
+        hedge["extra_tokens"] = loser.get("tokens", 0)
+        hedger.record_extra_tokens(hedge["extra_tokens"])
+        if hedge["winner"] == "hedge":
+            # Report the winning attempt's counts through the caller's dict (or the private one)
+            attempt_progress[0].update(attempt_progress[1])
+    debug_info["hedge"] = dict(hedge, stats=hedger.stats())
+    
+    # Never cache the fallback cube
+    if html_content and html_content != create_fallback_scene():
+        with span("scene_cache_store"):
+            scene_cache.set(cache_key, pack_scene(html_content)[0])
+    return html_content, debug_info
+
+# Per-rule post-processing timings as spans
+def record_postprocess_spans(stats):
+    record_span("postprocess_scan", stats["scan_ms"] / 1000)
+    record_span("postprocess_build", stats["build_ms"] / 1000)
+    for name, rule in stats["rules"].items():
+        if rule["applied"]:
+            record_span(f"postprocess.{name}", rule["time_ms"] / 1000, hits=rule["hits"])
+
+# Single request/response generation
+async def request_scene(data, debug_info, first_output=None):
+    """Send one generation request and post-process the returned HTML"""
+    budget = debug_info["budget"]
+    try:
+        with span("generation", mode="request"):
+            response = await api_client.post_messages(data, timeout=budget["timeout"])
+    except httpx.TimeoutException:
+        token_budget.record_timeout(budget["prompt_class"])
+        raise
+    if first_output is not None and response.status_code == 200:
+        first_output.set()
+    
+    debug_info["status_code"] = response.status_code
+    
+    if response.status_code != 200:
+        debug_info["error"] = f"API error: {response.status_code} - {response.text}"
+        return None, debug_info
+    
+    response_data = response.json()
+    usage = response_data.get("usage", {})
+    token_budget.record(
+        budget["prompt_class"],
+        "request",
+        usage.get("output_tokens", 0),
+        response_data.get("stop_reason"),
+        response.elapsed.total_seconds()
+    )
+    debug_info["response_meta"] = {
+        "model": response_data.get("model", ""),
+        "stop_reason": response_data.get("stop_reason"),
+        "usage": usage,
+        "cache_read_input_tokens": usage.get("cache_read_input_tokens", 0),
+        "cache_creation_input_tokens": usage.get("cache_creation_input_tokens", 0)
+    }
+    
+    if "content" in response_data and len(response_data["content"]) > 0:
+        response_text = response_data["content"][0]["text"]
+        # Get just the HTML portion
+        with span("extraction"):
+            html_content = extract_html_from_response(response_text)
+        # Fix CDN URLs and remove GLTFLoader references in one pass
+        html_content, debug_info["postprocess"] = postprocess_html(html_content)
+        record_postprocess_spans(debug_info["postprocess"])
+        debug_info["html_length"] = len(html_content)
+        return html_content, debug_info
+    else:
+        debug_info["error"] = "No content in response"
+        return None, debug_info
+
+# Streamed generation that stops as soon as the HTML document is complete
+async def stream_scene(data, debug_info, progress=None, first_output=None):
+    """Consume the Messages API event stream and assemble the HTML progressively"""
+    if progress is None:
+        progress = {}
+    progress.update({"tokens": 0, "tokens_per_sec": 0.0, "elapsed": 0.0})
+    
+    scanner = HtmlScanner()
+    usage = {}
+    stop_reason = None
+    # message_start already reports output_tokens (as 1); only message_delta carries the final count
+    final_usage = False
+    first_token_at = None
+    started = time.perf_counter()
+    
+    budget = debug_info["budget"]
+    try:
+        async with aclosing(api_client.stream_messages(data, timeout=budget["timeout"])) as events:
+            async for event_type, payload in events:
+                if event_type == "http_error":
+                    debug_info["status_code"] = payload["status_code"]
+                    debug_info["error"] = f"API error: {payload['status_code']} - {payload['text']}"
+                    return None, debug_info
+
+                if event_type == "restart":
+                    # The stream was overloaded mid-way and is being retried from scratch
+                    scanner = HtmlScanner()
+                    usage.clear()
+                    stop_reason = None
+                    final_usage = False
+                    first_token_at = None
+                    progress["tokens"] = 0
+                    debug_info["stream_retries"] = debug_info.get("stream_retries", 0) + 1
+                elif event_type == "message_start":
+                    debug_info["status_code"] = 200
+                    debug_info["response_meta"] = {"model": payload["message"].get("model", "")}
+                    usage.update(payload["message"].get("usage", {}))
+                elif event_type == "content_block_delta":
+                    text = payload["delta"].get("text", "")
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        if first_output is not None:
+                            first_output.set()
+                    scanner.feed(text)
+                
+                    # Roughly four characters per token until the final usage arrives
+                    now = time.perf_counter()
+                    progress["tokens"] = scanner.length // 4
+                    progress["elapsed"] = now - started
+                    if now - first_token_at > 0.1:
+                        progress["tokens_per_sec"] = progress["tokens"] / (now - first_token_at)
+                
+                    if scanner.complete:
+                        break
+                elif event_type == "message_delta":
+                    usage.update(payload.get("usage", {}))
+                    final_usage = True
+                    stop_reason = payload.get("delta", {}).get("stop_reason")
+                elif event_type == "error":
+                    debug_info["error"] = f"Stream error: {payload.get('error', {})}"
+                    return None, debug_info
+    except httpx.TimeoutException:
+        token_budget.record_timeout(budget["prompt_class"])
+        raise
+    
+    elapsed = time.perf_counter() - started
+    if final_usage and "output_tokens" in usage:
+        progress["tokens"] = usage["output_tokens"]
+    else:
+        # Stopped at </html> before the final count arrived; keep the scanner's estimate
+        usage.pop("output_tokens", None)
+        usage["output_tokens_estimated"] = progress["tokens"]
+    
+    debug_info.setdefault("response_meta", {})
+    debug_info["response_meta"]["usage"] = usage
+    debug_info["response_meta"]["cache_read_input_tokens"] = usage.get("cache_read_input_tokens", 0)
+    debug_info["response_meta"]["cache_creation_input_tokens"] = usage.get("cache_creation_input_tokens", 0)
+    debug_info["response_meta"]["stop_reason"] = stop_reason
+    record_span("generation", elapsed, mode="stream")
+    if first_token_at:
+        record_span("time_to_first_token", first_token_at - started)
+        # A stream's timeout bounds the gap between events, the longest of which is the first token;
+        # streams stopped at </html> report no stop_reason and count as not truncated
+        token_budget.record(budget["prompt_class"], "stream", progress["tokens"], stop_reason, first_token_at - started)
+        TOKENS_PER_SECOND.observe(progress["tokens_per_sec"])
+    debug_info["stream"] = {
+        "time_to_first_token": round(first_token_at - started, 3) if first_token_at else None,
+        "elapsed": round(elapsed, 3),
+        "tokens_received": progress["tokens"],
+        "tokens_per_sec": round(progress["tokens_per_sec"], 1),
+        "stopped_at_html_end": scanner.complete and stop_reason is None
+    }
+    
+    if scanner.length == 0:
+        debug_info["error"] = "No content in response"
+        return None, debug_info
+    
+    # Fall back to the regular extractor if the document never closed
+    with span("extraction"):
+        html_content = scanner.document if scanner.complete else scanner.extract()
+    html_content, debug_info["postprocess"] = postprocess_html(html_content)
+    record_postprocess_spans(debug_info["postprocess"])
+    debug_info["html_length"] = len(html_content)
+    return html_content, debug_info
+
+# Offline check for prompts that are already as detailed as an enhancement
+enhancement_bypass = EnhancementBypass(
+    EXAMPLE_MAPPINGS,
+    threshold=float(os.getenv("ENHANCE_BYPASS_THRESHOLD", "0.7"))
+)
+
+# Identical prompts in flight at the same time share one pipeline run
+single_flight = SingleFlight()
+
+# Duplicate requests that are slow to produce output (HEDGE_REQUESTS=1 to enable)
+hedger = Hedger()
+
+# Speculative generation settings
+SPECULATIVE_MAX_WORDS = int(os.getenv("SPECULATIVE_MAX_WORDS", "12"))
+SPECULATIVE_POLICY = os.getenv("SPECULATIVE_POLICY", "enhanced")
+
+async def _cancel(task):
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+# Race generation from the raw prompt against enhance-then-generate
+async def speculative_generate(basic_prompt, stream, progress, regenerate):
+    """Run raw-prompt generation concurrently with enhancement.
+
+    With the "enhanced" policy the raw scene is only used if it finishes
+    before enhancement does (or enhancement fails); otherwise it is cancelled
+    and generation continues from the enhanced prompt. With the "first"
+    policy both full paths race and the first successful scene wins.
+    """
+    progress["stage"] = "Enhancing prompt and generating speculatively"
+    raw_task = asyncio.create_task(
+        generate_scene(basic_prompt, basic_prompt, stream=stream, progress=progress, regenerate=regenerate)
+    )
+    enhance_task = asyncio.create_task(enhance_prompt(basic_prompt))
+    
+    enhanced_task = None
+    
+    def succeeded(task):
+        # A path that raised or produced no scene defers to the other one
+        return (
+            task is not None and task.done() and not task.cancelled()
+            and task.exception() is None and task.result()[0] is not None
+        )
+    
+    def enhance_failure():
+        if not enhance_task.done() or enhance_task.cancelled():
+            return None
+        if enhance_task.exception() is not None:
+            return type(enhance_task.exception()).__name__
+        return enhance_task.result()[1]
+    
+    async def enhanced_path():
+        enhanced_prompt, enhance_error = await enhance_task
+        if enhance_error:
+            return None, {}, basic_prompt, enhance_error
+        html_content, debug_info = await generate_scene(
+            enhanced_prompt,
+            basic_prompt,
+            stream=stream,
+            progress=progress if SPECULATIVE_POLICY == "enhanced" else {},
+            regenerate=regenerate
+        )
+        return html_content, debug_info, enhanced_prompt, None
+    
+    cancelled = None
+    try:
+        if SPECULATIVE_POLICY == "first":
+            enhanced_task = asyncio.create_task(enhanced_path())
+            pending = {raw_task, enhanced_task}
+            winner = None
+            while pending and winner is None:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if succeeded(raw_task):
+                    winner = "raw"
+                elif succeeded(enhanced_task):
+                    winner = "enhanced"
+            if winner is None:
+                # Both failed; prefer one that returned a result over one that raised
+                winner = "enhanced" if raw_task.exception() is not None and enhanced_task.exception() is None else "raw"
+        else:
+            await asyncio.wait({raw_task, enhance_task}, return_when=asyncio.FIRST_COMPLETED)
+            if succeeded(raw_task):
+                winner = "raw"
+            else:
+                await asyncio.wait({enhance_task})
+                if succeeded(raw_task) or enhance_failure():
+                    # Nothing better is coming, so the raw scene is the result
+                    winner = "raw"
+                    await asyncio.wait({raw_task})
+                else:
+                    winner = "enhanced"
+                    if not raw_task.done():
+                        await _cancel(raw_task)
+                        cancelled = "raw"
+                    enhanced_task = asyncio.create_task(enhanced_path())
+                    await asyncio.wait({enhanced_task})
+    finally:
+        # The losing path (or every path, if the caller was cancelled) stops here
+        for name, task in (("raw", raw_task), ("enhanced", enhanced_task), ("enhanced", enhance_task)):
+            if task is not None and not task.done():
+                await _cancel(task)
+                cancelled = cancelled or name
+    
+    if winner == "raw":
+        html_content, debug_info = raw_task.result()
+        enhance_error = enhance_failure()
+        prompt_to_use = basic_prompt
+    else:
+        html_content, debug_info, prompt_to_use, enhance_error = enhanced_task.result()
+    
+    debug_info["speculative"] = {
+        "policy": SPECULATIVE_POLICY,
+        "path": winner,
+        "cancelled": cancelled
+    }
+    return html_content, debug_info, prompt_to_use, enhance_error
+
+# Scene of a near-duplicate earlier prompt, offered by the UI or served with reuse_similar
+def find_similar_scene(basic_prompt):
+    """Return (html_content, debug_info) of the most similar earlier prompt's cached scene, or None"""
+    with span("similar_lookup"):
+        match = prompt_index.query(basic_prompt)
+        packed = scene_cache.get(match["scene_key"]) if match else None
+    if packed is None:
+        return None
+    html_content = unpack_scene(packed)
+    debug_info = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "similar_match": match,
+        "scene_cache": "similar",
+        "scene_cache_key": match["scene_key"],
+        "html_length": len(html_content),
+        "original_prompt": basic_prompt,
+        "enhanced_prompt": match["enhanced_prompt"] or match["prompt"]
+    }
+    return html_content, debug_info
+
+# Span collection and end-to-end metrics around one pipeline run
+async def traced_pipeline(pipeline):
+    spans = start_trace()
+    started = time.perf_counter()
+    try:
+        html_content, debug_info = await pipeline
+    except Exception:
+        SCENES.inc(outcome="error")
+        raise
+    outcome = debug_info.get("scene_cache", "miss") if html_content else "failed"
+    PIPELINE_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+    SCENES.inc(outcome=outcome)
+    debug_info["spans"] = spans
+    return html_content, debug_info
+
+# Complete scene generation pipeline
+async def generate_scene_from_prompt(
+    basic_prompt,
+    stream=False,
+    progress=None,
+    regenerate=False,
+    reuse_similar=False,
+    speculative=False,
+    coalesce=True
+):
+    """Complete pipeline: enhance prompt then generate scene"""
+    if progress is None:
+        progress = {}
+    
+    # Join an identical request already in flight instead of paying for it again
+    if coalesce:
+        flight_key = make_key("flight", normalize_prompt(basic_prompt), regenerate, reuse_similar, speculative)
+        if flight_key in single_flight:
+            progress["stage"] = "Joined an identical request in flight"
+        (html_content, debug_info), joined = await single_flight.do(
+            flight_key,
+            lambda: traced_pipeline(generate_scene_from_prompt(
+                basic_prompt,
+                stream=stream,
+                progress=progress,
+                regenerate=regenerate,
+                reuse_similar=reuse_similar,
+                speculative=speculative,
+                coalesce=False
+            ))
+        )
+        debug_info = dict(debug_info)
+        debug_info["single_flight"] = dict(
+            single_flight.stats(),
+            role="joined" if joined else "leader",
+            key=flight_key
+        )
+        return html_content, debug_info
+    
+    # Step 0: Serve the scene of a near-duplicate earlier prompt without any API call
+    if reuse_similar and not regenerate:
+        similar = find_similar_scene(basic_prompt)
+        if similar is not None:
+            return similar
+    
+    # Already-detailed prompts go straight to generation
+    bypass = enhancement_bypass.assess(basic_prompt)
+    
+    if bypass["bypassed"]:
+        progress["stage"] = "Generating scene"
+        prompt_to_use, enhance_error = basic_prompt, None
+        html_content, debug_info = await generate_scene(
+            basic_prompt,
+            basic_prompt,
+            stream=stream,
+            progress=progress,
+            regenerate=regenerate
+        )
+    elif speculative and len(basic_prompt.split()) <= SPECULATIVE_MAX_WORDS:
+        html_content, debug_info, prompt_to_use, enhance_error = await speculative_generate(
+            basic_prompt, stream, progress, regenerate
+        )
+    else:
+        # Step 1: Enhance the prompt with more details
+        progress["stage"] = "Enhancing prompt"
+        enhance_started = time.perf_counter()
+        with span("enhance"):
+            enhanced_prompt, enhance_error = await enhance_prompt(basic_prompt)
+        enhancement_bypass.record_enhance_latency(time.perf_counter() - enhance_started)
+        prompt_to_use = basic_prompt if enhance_error else enhanced_prompt
+        
+        # Step 2: Generate the scene with the enhanced prompt
+        progress["stage"] = "Generating scene"
+        html_content, debug_info = await generate_scene(
+            prompt_to_use,
+            basic_prompt,
+            stream=stream,
+            progress=progress,
+            regenerate=regenerate
+        )
+    
+    # This runs on the shared client loop, so warnings are handed back to the UI
+    if enhance_error:
+        debug_info.setdefault("warnings", []).append(
+            f"Using basic prompt because enhancement failed: {enhance_error}"
+        )
+    
+    # Store both prompts and debug info
+    debug_info["original_prompt"] = basic_prompt
+    debug_info["enhanced_prompt"] = prompt_to_use
+    debug_info["enhance_cache"] = enhance_cache.stats()
+    debug_info["governor"] = api_client.governor.stats()
+    debug_info["token_budget"] = token_budget.stats()
+    debug_info["model_router"] = model_router.stats()
+    debug_info["enhancement_bypass"] = bypass
+    
+    if html_content and "scene_cache_key" in debug_info:
+        prompt_index.add(basic_prompt, debug_info["scene_cache_key"], prompt_to_use)
+    
+    return html_content, debug_info
+
+# Compact record kept in history: packed scene plus de-duplicated debug info
+def compact_scene(prompt, html_content, debug_info):
+    """Pack a scene's HTML and drop the prompt copies duplicated in debug_info"""
+    blob, storage = pack_scene(html_content)
+    debug_info = dict(debug_info)
+    enhanced_prompt = debug_info.pop("enhanced_prompt", prompt)
+    debug_info.pop("original_prompt", None)
+    if "request" in debug_info:
+        debug_info["request"] = {
+            key: value for key, value in debug_info["request"].items()
+            if key not in ("simple_prompt", "enhanced_prompt")
+        }
+    debug_info["storage"] = storage
+    return {
+        "prompt": prompt,
+        "enhanced_prompt": enhanced_prompt,
+        "scene": blob,
+        "debug_info": debug_info
+    }
@@ -0,0 +1,201 @@
+"""Generate scenes for every prompt in a JSONL (or plain text) file without Streamlit.
+
+    python scripts/batch_generate.py prompts.jsonl --out gallery/ --concurrency 4
+
+Each input line is either a JSON object (the prompt is read from
+``--prompt-field``, falling back to "prompt", "title" and "body") or a
+plain text prompt. Scenes are written to ``<out>/scenes/<id>.html`` and a
+result line is appended to ``<out>/results.jsonl`` as each prompt
+finishes, so an interrupted run can be restarted with the same command and
+only the missing prompts are generated. ``<out>/summary.json`` reports
+latency percentiles and token usage over every result in results.jsonl,
+and throughput for the latest run.
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scene_engine import api_client, generate_scene_from_prompt
+
+
+def read_prompts(path, prompt_field, id_field):
+    """Return (id, prompt) pairs from a JSONL or plain text file"""
+    prompts = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                prompt = next(
+                    (record[field] for field in (prompt_field, "prompt", "title", "body") if record.get(field)),
+                    None
+                )
+                prompt_id = str(record.get(id_field) or number)
+            else:
+                prompt, prompt_id = line, str(number)
+            if prompt:
+                # Ids become file names
+                prompts.append((re.sub(r"[^\w.-]+", "_", prompt_id), prompt))
+    return prompts
+
+
+def read_results(results_path):
+    """Latest result of every id in results.jsonl, in file order"""
+    results = {}
+    if os.path.isfile(results_path):
+        with open(results_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by an interruption
+                    continue
+                # A retried prompt replaces its earlier failure
+                results.pop(result["id"], None)
+                results[result["id"]] = result
+    return list(results.values())
+
+
+def read_done(results_path, retry_failed):
+    """Ids already finished by an earlier run"""
+    return {
+        result["id"] for result in read_results(results_path)
+        if result["status"] == "ok" or not retry_failed
+    }
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)], 3)
+
+
+async def run_batch(prompts, args):
+    scenes_dir = os.path.join(args.out, "scenes")
+    os.makedirs(scenes_dir, exist_ok=True)
+    results_path = os.path.join(args.out, "results.jsonl")
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = []
+
+    async def run_one(prompt_id, prompt):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                html_content, debug_info = await generate_scene_from_prompt(
+                    prompt,
+                    stream=args.stream,
+                    regenerate=args.regenerate,
+                    reuse_similar=args.reuse_similar,
+                    speculative=args.speculative
+                )
+                error = debug_info.get("error")
+            except Exception as e:
+                html_content, debug_info, error = None, {}, f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - started
+
+        usage = debug_info.get("response_meta", {}).get("usage", {})
+        result = {
+            "id": prompt_id,
+            "prompt": prompt,
+            "status": "ok" if html_content else "failed",
+            "error": None if html_content else error or "Failed to generate scene",
+            "file": None,
+            "elapsed_s": round(elapsed, 3),
+            "time_to_first_token_s": debug_info.get("stream", {}).get("time_to_first_token"),
+            "scene_cache": debug_info.get("scene_cache"),
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", usage.get("output_tokens_estimated", 0)),
+            "warnings": debug_info.get("warnings", [])
+        }
+        if html_content:
+            result["file"] = os.path.join("scenes", f"{prompt_id}.html")
+            with open(os.path.join(args.out, result["file"]), "w", encoding="utf-8") as f:
+                f.write(html_content)
+
+        # The result line is written last, so a scene only counts as done once it is on disk
+        with open(results_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        results.append(result)
+        print(f"[{len(results)}/{len(prompts)}] {result['status']:6} {elapsed:6.1f}s  {prompt_id}: {prompt[:60]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_one(prompt_id, prompt) for prompt_id, prompt in prompts))
+    return results, time.perf_counter() - started
+
+
+def summarize(results, run_results, wall_s, args):
+    """Totals over every result so far, plus the throughput of this run's results"""
+    ok = [result for result in results if result["status"] == "ok"]
+    latencies = [result["elapsed_s"] for result in ok]
+    run_ok = sum(1 for result in run_results if result["status"] == "ok")
+    run_output_tokens = sum(result["output_tokens"] for result in run_results)
+    return {
+        "prompts": len(results),
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": max(latencies) if latencies else None
+        },
+        "input_tokens": sum(result["input_tokens"] for result in results),
+        "output_tokens": sum(result["output_tokens"] for result in results),
+        "scene_cache": {
+            status: sum(1 for result in results if result["scene_cache"] == status)
+            for status in sorted({result["scene_cache"] for result in results if result["scene_cache"]})
+        },
+        "last_run": {
+            "prompts": len(run_results),
+            "ok": run_ok,
+            "concurrency": args.concurrency,
+            "wall_s": round(wall_s, 3),
+            "scenes_per_min": round(run_ok / wall_s * 60, 2) if wall_s else 0.0,
+            "output_tokens_per_sec": round(run_output_tokens / wall_s, 1) if wall_s else 0.0
+        },
+        "governor": api_client.governor.stats()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("prompts", help="JSONL or plain text file with one prompt per line")
+    parser.add_argument("--out", default="gallery", help="output directory (default: gallery)")
+    parser.add_argument("--concurrency", "-j", type=int, default=4, help="prompts generated at once (default: 4)")
+    parser.add_argument("--prompt-field", default="prompt", help="JSON field holding the prompt")
+    parser.add_argument("--id-field", default="id", help="JSON field holding a stable id (default: line number)")
+    parser.add_argument("--stream", action="store_true", help="stream generation and stop at </html>")
+    parser.add_argument("--regenerate", action="store_true", help="skip the scene cache")
+    parser.add_argument("--reuse-similar", action="store_true", help="serve scenes of similar earlier prompts instead of generating")
+    parser.add_argument("--speculative", action="store_true", help="start generation before enhancement finishes")
+    parser.add_argument("--retry-failed", action="store_true", help="on resume, retry prompts that failed before")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    prompts = read_prompts(args.prompts, args.prompt_field, args.id_field)
+    results_path = os.path.join(args.out, "results.jsonl")
+    done = read_done(results_path, args.retry_failed)
+    pending = [(prompt_id, prompt) for prompt_id, prompt in prompts if prompt_id not in done]
+    print(f"{len(prompts)} prompts, {len(prompts) - len(pending)} already done, {len(pending)} to generate")
+    if not pending:
+        return
+
+    # All upstream calls must run on the client manager's loop
+    run_results, wall_s = api_client.run(run_batch(pending, args))
+    # Earlier runs' results are part of the gallery too
+    summary = summarize(read_results(results_path), run_results, wall_s, args)
+    with open(os.path.join(args.out, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
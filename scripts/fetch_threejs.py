@@ -0,0 +1,56 @@
+"""Download the pinned Three.js runtime into static/three/<version>/.
+
+Run once on a machine with network access (the directory can then be
+copied to air-gapped hosts):
+
+    python scripts/fetch_threejs.py
+
+A SHA256SUMS file is written next to the files; later runs verify the
+vendored copy against it instead of downloading again.
+"""
+import os
+import sys
+import hashlib
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from threejs_runtime import CDN_BASE_URL, RUNTIME_DIR, RUNTIME_FILES, THREE_VERSION, runtime_path
+
+
+def sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def main():
+    sums_path = os.path.join(RUNTIME_DIR, THREE_VERSION, "SHA256SUMS")
+
+    if os.path.isfile(sums_path):
+        with open(sums_path, encoding="utf-8") as f:
+            expected = dict(line.split()[::-1] for line in f if line.strip())
+        bad = [path for path in RUNTIME_FILES if sha256(runtime_path(path)) != expected.get(path)]
+        if bad:
+            sys.exit(f"Checksum mismatch for: {', '.join(bad)}")
+        print(f"Three.js {THREE_VERSION} already vendored and verified")
+        return
+
+    lines = []
+    with httpx.Client(follow_redirects=True, timeout=60.0) as client:
+        for path in RUNTIME_FILES:
+            response = client.get(f"{CDN_BASE_URL}/{path}")
+            response.raise_for_status()
+            target = runtime_path(path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(response.content)
+            lines.append(f"{hashlib.sha256(response.content).hexdigest()}  {path}\n")
+            print(f"Fetched {path} ({len(response.content)} bytes)")
+
+    with open(sums_path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import os
+import re
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+from array import array
+
+# MinHash signature layout: NUM_BANDS bands of ROWS_PER_BAND hashes each.
+# Pairs with Jaccard similarity around (1 / NUM_BANDS) ** (1 / ROWS_PER_BAND)
+# (about 0.5 here) or higher share at least one band bucket.
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+_PRIME = (1 << 61) - 1
+
+_rng = random.Random(1337)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# Function words and request boilerplate only; size, quantity and degree words change the scene
+STOP_WORDS = frozenset("""
+a an the and or of with in on at to for from by is are be into onto over under
+this that these those it its i me my want please create make show scene 3d three js threejs
+""".split())
+
+# Bumped whenever prompt_tokens or index_tokens change, so stored entries are re-tokenized
+TOKENIZER_VERSION = 2
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def prompt_words(prompt):
+    """Content words of a prompt in order, with a light plural stemming"""
+    words = []
+    for word in WORD.findall(prompt.lower()):
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def prompt_tokens(prompt):
+    """Set of content words of a prompt"""
+    return set(prompt_words(prompt))
+
+
+def index_tokens(prompt):
+    """Content words plus adjacent word pairs, so word order counts ("cat chasing dog" is not "dog chasing cat")"""
+    words = prompt_words(prompt)
+    return frozenset(words) | frozenset(f"{first}_{second}" for first, second in zip(words, words[1:]))
+
+
+def minhash(tokens):
+    """MinHash signature of a token set"""
+    hashes = [int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little") for t in tokens]
+    return array("Q", [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS])
+
+
+def _band_keys(signature):
+    return [
+        (band, tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+        for band in range(NUM_BANDS)
+    ]
+
+
+class PromptIndex:
+    """Offline near-duplicate index over previously generated prompts.
+
+    Candidates come from MinHash LSH buckets held in memory, so lookups touch
+    a handful of entries no matter how many prompts are stored; candidates
+    are then ranked by exact Jaccard similarity of their content words and
+    adjacent word pairs. Entries are persisted to SQLite and reloaded on
+    startup, and re-tokenized once when ``TOKENIZER_VERSION`` changes.
+    """
+
+    def __init__(self, path, threshold=0.75):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._by_tokens = {}
+        self._buckets = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS prompts (
+                id INTEGER PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                tokens TEXT NOT NULL UNIQUE,
+                signature BLOB NOT NULL,
+                scene_key TEXT NOT NULL,
+                enhanced_prompt TEXT,
+                created_at REAL NOT NULL
+            )"""
+        )
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < TOKENIZER_VERSION:
+            self._retokenize()
+        for row in self._conn.execute("SELECT id, prompt, tokens, signature, scene_key, enhanced_prompt FROM prompts"):
+            entry_id, prompt, tokens, blob, scene_key, enhanced_prompt = row
+            signature = array("Q")
+            signature.frombytes(blob)
+            self._insert(entry_id, prompt, frozenset(tokens.split()), signature, scene_key, enhanced_prompt)
+
+    def _retokenize(self):
+        # Entries that no longer have content words, or now collide, are dropped
+        rows = self._conn.execute("SELECT id, prompt FROM prompts ORDER BY id DESC").fetchall()
+        seen = set()
+        self._conn.execute("BEGIN")
+        # Park the old token keys first so the UNIQUE constraint only sees new ones
+        self._conn.execute("UPDATE prompts SET tokens = '#' || id")
+        for entry_id, prompt in rows:
+            tokens = index_tokens(prompt)
+            key = " ".join(sorted(tokens))
+            if not tokens or key in seen:
+                self._conn.execute("DELETE FROM prompts WHERE id = ?", (entry_id,))
+                continue
+            seen.add(key)
+            self._conn.execute(
+                "UPDATE prompts SET tokens = ?, signature = ? WHERE id = ?",
+                (key, minhash(tokens).tobytes(), entry_id)
+            )
+        self._conn.execute(f"PRAGMA user_version = {TOKENIZER_VERSION}")
+        self._conn.execute("COMMIT")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _insert(self, entry_id, prompt, tokens, signature, scene_key, enhanced_prompt):
+        self._entries[entry_id] = {
+            "prompt": prompt,
+            "tokens": tokens,
+            "scene_key": scene_key,
+            "enhanced_prompt": enhanced_prompt
+        }
+        self._by_tokens[tokens] = entry_id
+        for band_key in _band_keys(signature):
+            self._buckets.setdefault(band_key, []).append(entry_id)
+
+    def add(self, prompt, scene_key, enhanced_prompt=None):
+        """Index a prompt and the cache key of the scene generated for it"""
+        tokens = index_tokens(prompt)
+        if not tokens:
+            return
+        with self._lock:
+            existing = self._by_tokens.get(tokens)
+            if existing is not None:
+                # Same content words: point the entry at the newest scene
+                self._entries[existing].update(scene_key=scene_key, enhanced_prompt=enhanced_prompt)
+                self._conn.execute(
+                    "UPDATE prompts SET scene_key = ?, enhanced_prompt = ? WHERE id = ?",
+                    (scene_key, enhanced_prompt, existing)
+                )
+                return
+
+            signature = minhash(tokens)
+            cursor = self._conn.execute(
+                "INSERT INTO prompts (prompt, tokens, signature, scene_key, enhanced_prompt, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (prompt, " ".join(sorted(tokens)), signature.tobytes(), scene_key, enhanced_prompt, time.time())
+            )
+            self._insert(cursor.lastrowid, prompt, tokens, signature, scene_key, enhanced_prompt)
+
+    def query(self, prompt, threshold=None):
+        """Return the most similar stored prompt at or above the threshold, or None"""
+        threshold = self.threshold if threshold is None else threshold
+        tokens = index_tokens(prompt)
+        if not tokens:
+            return None
+
+        with self._lock:
+            candidates = set()
+            for band_key in _band_keys(minhash(tokens)):
+                candidates.update(self._buckets.get(band_key, ()))
+
+            best, best_similarity = None, 0.0
+            for entry_id in candidates:
+                other = self._entries[entry_id]["tokens"]
+                similarity = len(tokens & other) / len(tokens | other)
+                if similarity > best_similarity:
+                    best, best_similarity = entry_id, similarity
+
+            if best is None or best_similarity < threshold:
+                return None
+            return self._match(best, round(best_similarity, 3))
+
+    def _match(self, entry_id, similarity):
+        entry = self._entries[entry_id]
+        return {
+            "prompt": entry["prompt"],
+            "scene_key": entry["scene_key"],
+            "enhanced_prompt": entry["enhanced_prompt"],
+            "similarity": similarity
+        }
@@ -0,0 +1,43 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls into one shared upstream call.
+
+    The first caller for a key (the leader) starts the work; callers that
+    arrive with the same key while it is running (followers) await the
+    same task and receive its result or exception. The key is dropped as
+    soon as the call finishes, so later callers start fresh. Must be used
+    from a single event loop (the ``ClientManager`` loop).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.joined = 0
+
+    async def do(self, key, coro_factory):
+        """Return ``(result, joined)`` for ``coro_factory()`` shared under ``key``"""
+        task = self._calls.get(key)
+        joined = task is not None
+        if joined:
+            self.joined += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(coro_factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Shielded so one caller going away does not cancel everyone's call
+        return await asyncio.shield(task), joined
+
+    def __contains__(self, key):
+        return key in self._calls
+
+    def stats(self):
+        total = self.leaders + self.joined
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "joined": self.joined,
+            "coalesced_rate": round(self.joined / total, 3) if total else 0.0
+        }
@@ -1,97 +1,123 @@
+import re
+import functools
 import streamlit.components.v1 as components
-import os
-import tempfile
-import base64
+from threejs_runtime import localize_runtime
 
-def render_threejs_enhanced(html_content, height=600):
-    """Render Three.js content with additional features."""
-    # Add error handling wrapper around the HTML content
-    enhanced_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <style>
-            body {{ margin: 0; overflow: hidden; font-family: Arial, sans-serif; }}
-            #errorOverlay {{
-                display: none;
-                position: absolute;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background-color: rgba(0,0,0,0.7);
-                color: white;
-                padding: 20px;
-                box-sizing: border-box;
-                overflow: auto;
-                z-index: 1000;
-            }}
-            #stats {{
-                position: absolute;
-                bottom: 10px;
-                left: 10px;
-                background-color: rgba(0,0,0,0.5);
-                color: white;
-                padding: 5px;
-                border-radius: 3px;
-                font-size: 12px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div id="errorOverlay"></div>
-        <div id="stats"></div>
-        <script>
-            // Error handling
-            window.addEventListener('error', function(event) {{
+# Injected at the top of <head> so errors from the scene's own scripts are caught
+HEAD_INJECTION = """
+    <style>
+        body { margin: 0; overflow: hidden; font-family: Arial, sans-serif; }
+        #errorOverlay {
+            display: none;
+            position: absolute;
+            top: 0;
+            left: 0;
+            width: 100%;
+            height: 100%;
+            background-color: rgba(0,0,0,0.7);
+            color: white;
+            padding: 20px;
+            box-sizing: border-box;
+            overflow: auto;
+            z-index: 1000;
+        }
+        #stats {
+            position: absolute;
+            bottom: 10px;
+            left: 10px;
+            background-color: rgba(0,0,0,0.5);
+            color: white;
+            padding: 5px;
+            border-radius: 3px;
+            font-size: 12px;
+        }
+    </style>
+    <script>
+        // Error handling; errors raised before the body is parsed are shown once it is
+        window.addEventListener('error', function(event) {
+            function show() {
                 const errorOverlay = document.getElementById('errorOverlay');
-                errorOverlay.innerHTML = '<h3>Error:</h3><pre>' + event.message + 
-                    '\\n\\nLine: ' + event.lineno + 
+                errorOverlay.innerHTML = '<h3>Error:</h3><pre>' + event.message +
+                    '\\n\\nLine: ' + event.lineno +
                     '\\nFile: ' + event.filename + '</pre>';
                 errorOverlay.style.display = 'block';
-                console.error(event);
-            }});
-            
-            // Performance stats
-            let frameCount = 0;
-            let lastTime = performance.now();
-            
-            function updateStats() {{
-                const now = performance.now();
-                const elapsed = now - lastTime;
-                
-                if (elapsed >= 1000) {{
-                    const fps = Math.round((frameCount * 1000) / elapsed);
-                    document.getElementById('stats').textContent = fps + ' FPS';
-                    
-                    frameCount = 0;
-                    lastTime = now;
-                }}
-                
-                frameCount++;
-                requestAnimationFrame(updateStats);
-            }}
-            
+            }
+            if (document.getElementById('errorOverlay')) {
+                show();
+            } else {
+                document.addEventListener('DOMContentLoaded', show);
+            }
+            console.error(event);
+        });
+    </script>
+"""
+
+# Injected right after <body>, ahead of the scene's markup
+BODY_INJECTION = """
+    <div id="errorOverlay"></div>
+    <div id="stats"></div>
+    <script>
+        // Performance stats
+        let frameCount = 0;
+        let lastTime = performance.now();
+
+        function updateStats() {
+            const now = performance.now();
+            const elapsed = now - lastTime;
+
+            if (elapsed >= 1000) {
+                const fps = Math.round((frameCount * 1000) / elapsed);
+                document.getElementById('stats').textContent = fps + ' FPS';
+
+                frameCount = 0;
+                lastTime = now;
+            }
+
+            frameCount++;
             requestAnimationFrame(updateStats);
-        </script>
-        
-        {html_content}
-    </body>
-    </html>
+        }
+
+        requestAnimationFrame(updateStats);
+    </script>
+"""
+
+HEAD_OPEN = re.compile(r"<head\b[^>]*>", re.IGNORECASE)
+BODY_OPEN = re.compile(r"<body\b[^>]*>", re.IGNORECASE)
+
+# Number of wrapped scenes kept; a rerun shows at most a couple
+RENDER_CACHE_SIZE = 16
+
+
+@functools.lru_cache(maxsize=RENDER_CACHE_SIZE)
+def enhance_scene_html(html_content):
+    """Scene document with the error overlay and FPS stats injected, memoized per scene.
+
+    The overlay is spliced into the scene's own <head> and <body> in a
+    single join instead of nesting the scene inside a wrapper document.
+    Fragments without a <body> get a minimal document around them.
     """
-    
-    # Create a temporary HTML file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.html', mode='w', encoding='utf-8') as f:
-        f.write(enhanced_html)
-        temp_path = f.name
-    
-    # Read the file content
-    with open(temp_path, 'r', encoding='utf-8') as f:
-        html_content = f.read()
-    
-    # Delete the temporary file
-    os.unlink(temp_path)
-    
-    # Render HTML in an iframe
-    components.html(html_content, height=height, scrolling=False)
\ No newline at end of file
+    html_content = localize_runtime(html_content)
+    body = BODY_OPEN.search(html_content)
+    if body is None:
+        return "".join((
+            "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">",
+            HEAD_INJECTION,
+            "</head>\n<body>",
+            BODY_INJECTION,
+            html_content,
+            "\n</body>\n</html>"
+        ))
+    head = HEAD_OPEN.search(html_content, 0, body.start())
+    head_at = head.end() if head is not None else body.start()
+    return "".join((
+        html_content[:head_at],
+        HEAD_INJECTION,
+        html_content[head_at:body.end()],
+        BODY_INJECTION,
+        html_content[body.end():]
+    ))
+
+
+def render_threejs_enhanced(html_content, height=600):
+    """Render Three.js content with additional features."""
+    components.html(enhance_scene_html(html_content), height=height, scrolling=False)
@@ -0,0 +1,126 @@
+import os
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Pinned Three.js build shipped with the app
+THREE_VERSION = os.getenv("THREEJS_VERSION", "0.137.0")
+THREE_JS_PATH = "build/three.min.js"
+ORBIT_CONTROLS_PATH = "examples/js/controls/OrbitControls.js"
+RUNTIME_FILES = (THREE_JS_PATH, ORBIT_CONTROLS_PATH)
+
+# Canonical references stored in generated scenes; mapped to the local copy at render time
+CDN_BASE_URL = f"https://unpkg.com/three@{THREE_VERSION}"
+THREE_JS_URL = f"{CDN_BASE_URL}/{THREE_JS_PATH}"
+ORBIT_CONTROLS_URL = f"{CDN_BASE_URL}/{ORBIT_CONTROLS_PATH}"
+
+# Where the vendored files live and how the browser reaches them
+RUNTIME_DIR = os.getenv(
+    "THREEJS_RUNTIME_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "three")
+)
+RUNTIME_HOST = os.getenv("THREEJS_RUNTIME_HOST", "127.0.0.1")
+RUNTIME_PORT = int(os.getenv("THREEJS_RUNTIME_PORT", "8502"))
+# Base URL at which viewers' browsers reach the runtime server, e.g. http://localhost:8502 for a
+# local run; there is no safe default for remote deployments, so without it scenes use the CDN
+RUNTIME_PUBLIC_URL = os.getenv("THREEJS_RUNTIME_PUBLIC_URL", "")
+
+
+def runtime_path(path, version=THREE_VERSION):
+    """Location of a vendored runtime file on disk"""
+    return os.path.join(RUNTIME_DIR, version, *path.split("/"))
+
+
+def runtime_available(version=THREE_VERSION):
+    """True when every pinned runtime file has been vendored"""
+    return all(os.path.isfile(runtime_path(path, version)) for path in RUNTIME_FILES)
+
+
+class _RuntimeHandler(BaseHTTPRequestHandler):
+    # Only the pinned files are served, read once and kept in memory
+    files = {}
+
+    def do_GET(self):
+        entry = self.files.get(self.path.split("?", 1)[0])
+        if entry is None:
+            self.send_error(404)
+            return
+        body, etag = entry
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/javascript; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        # Paths carry the version, so a given URL never changes content
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        self.send_header("ETag", etag)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RuntimeServer:
+    """Serves the vendored Three.js build from a small background HTTP server.
+
+    Streamlit's own static route serves ``.js`` files as ``text/plain``
+    with ``nosniff``, which browsers refuse to execute, so the runtime gets
+    its own route with a JavaScript content type and immutable caching.
+    """
+
+    def __init__(self, host=RUNTIME_HOST, port=RUNTIME_PORT, public_url=RUNTIME_PUBLIC_URL):
+        files = {}
+        for path in RUNTIME_FILES:
+            with open(runtime_path(path), "rb") as f:
+                body = f.read()
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            files[f"/three/{THREE_VERSION}/{path}"] = (body, etag)
+        handler = type("RuntimeHandler", (_RuntimeHandler,), {"files": files})
+
+        self.public_url = public_url.rstrip("/")
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="threejs-runtime", daemon=True)
+        self._thread.start()
+
+    def url(self, path):
+        return f"{self.public_url}/three/{THREE_VERSION}/{path}"
+
+    def localize(self, html_content):
+        """Point the canonical runtime references of a scene at this server"""
+        return html_content.replace(
+            THREE_JS_URL, self.url(THREE_JS_PATH)
+        ).replace(
+            ORBIT_CONTROLS_URL, self.url(ORBIT_CONTROLS_PATH)
+        )
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_runtime_server():
+    """Start the process-wide runtime server if it is vendored and has a public URL, else return None"""
+    global _server
+    with _server_lock:
+        if _server is None and RUNTIME_PUBLIC_URL and runtime_available():
+            try:
+                _server = RuntimeServer()
+            except OSError:
+                # Port taken (e.g. by another app process); keep using the CDN
+                return None
+        return _server
+
+
+def localize_runtime(html_content):
+    """Serve a scene's Three.js from the local copy when it is running"""
+    return _server.localize(html_content) if _server is not None else html_content
@@ -0,0 +1,140 @@
+import os
+import threading
+from collections import deque
+
+# Adaptive budgets; BUDGET_ADAPTIVE=0 always uses the stage defaults
+BUDGET_ADAPTIVE = os.getenv("BUDGET_ADAPTIVE", "1") != "0"
+BUDGET_PERCENTILE = float(os.getenv("BUDGET_PERCENTILE", "99"))
+BUDGET_TOKEN_HEADROOM = float(os.getenv("BUDGET_TOKEN_HEADROOM", "1.25"))
+BUDGET_TIMEOUT_HEADROOM = float(os.getenv("BUDGET_TIMEOUT_HEADROOM", "2.0"))
+BUDGET_MIN_SAMPLES = int(os.getenv("BUDGET_MIN_SAMPLES", "30"))
+BUDGET_MAX_TRUNCATION = float(os.getenv("BUDGET_MAX_TRUNCATION", "0.02"))
+BUDGET_WINDOW = int(os.getenv("BUDGET_WINDOW", "300"))
+
+# Prompt length buckets (words) used to tell prompt classes apart
+SIZE_BUCKETS = ((40, "short"), (120, "medium"))
+
+
+def prompt_class(stage, prompt):
+    """Class of a request, e.g. "generate:long", from its stage and prompt length"""
+    words = len(prompt.split())
+    for limit, name in SIZE_BUCKETS:
+        if words < limit:
+            return f"{stage}:{name}"
+    return f"{stage}:long"
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+class ClassStats:
+    """Recent outcomes of one prompt class"""
+
+    def __init__(self, window):
+        self.output_tokens = deque(maxlen=window)
+        # Latency is what the timeout guards: the whole response, or the wait for the first streamed token
+        self.latency = {}
+        # One flag per request: whether it was truncated or timed out
+        self.failures = deque(maxlen=window)
+        self.truncated = 0
+        self.timeouts = 0
+        self.window = window
+
+    def latencies(self, mode):
+        return self.latency.setdefault(mode, deque(maxlen=self.window))
+
+
+class TokenBudget:
+    """Per-class ``max_tokens`` and timeouts learned from observed responses.
+
+    Every finished request records its output tokens, ``stop_reason`` and
+    latency under its prompt class. Once a class has ``min_samples``
+    outcomes, its token budget is the ``percentile`` of recent output
+    sizes times ``token_headroom`` and its timeout the same percentile of
+    recent latencies times ``timeout_headroom``; both are bounded by the
+    stage defaults, which also apply until enough samples are seen. A class
+    whose recent truncation (``stop_reason == "max_tokens"``) or timeout
+    rate exceeds ``max_truncation`` falls back to the defaults, so tighter
+    budgets never make truncation more common.
+    """
+
+    def __init__(
+        self,
+        defaults,
+        adaptive=BUDGET_ADAPTIVE,
+        percentile=BUDGET_PERCENTILE,
+        token_headroom=BUDGET_TOKEN_HEADROOM,
+        timeout_headroom=BUDGET_TIMEOUT_HEADROOM,
+        min_samples=BUDGET_MIN_SAMPLES,
+        max_truncation=BUDGET_MAX_TRUNCATION,
+        window=BUDGET_WINDOW
+    ):
+        # {stage: {"max_tokens": ..., "timeout": ..., "min_tokens": ..., "min_timeout": ...}}
+        self.defaults = defaults
+        self.adaptive = adaptive
+        self.percentile = percentile
+        self.token_headroom = token_headroom
+        self.timeout_headroom = timeout_headroom
+        self.min_samples = min_samples
+        self.max_truncation = max_truncation
+        self.window = window
+        self.classes = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, name):
+        return self.classes.setdefault(name, ClassStats(self.window))
+
+    def budget(self, name, mode="request"):
+        """``{"max_tokens", "timeout", "source"}`` for the next request of a class"""
+        defaults = self.defaults[name.split(":", 1)[0]]
+        budget = {"max_tokens": defaults["max_tokens"], "timeout": defaults["timeout"], "source": "default"}
+        if not self.adaptive:
+            return budget
+        with self._lock:
+            stats = self._stats(name)
+            tokens = list(stats.output_tokens)
+            latencies = list(stats.latencies(mode))
+            failures = list(stats.failures)
+        if len(failures) >= self.min_samples and sum(failures) / len(failures) > self.max_truncation:
+            budget["source"] = "default (truncation)"
+            return budget
+        if len(tokens) >= self.min_samples:
+            learned = int(_percentile(tokens, self.percentile) * self.token_headroom)
+            budget["max_tokens"] = min(max(learned, defaults["min_tokens"]), defaults["max_tokens"])
+            budget["source"] = "learned"
+        if len(latencies) >= self.min_samples:
+            learned = _percentile(latencies, self.percentile) * self.timeout_headroom
+            budget["timeout"] = round(min(max(learned, defaults["min_timeout"]), defaults["timeout"]), 1)
+            budget["source"] = "learned"
+        return budget
+
+    def record(self, name, mode, output_tokens, stop_reason, latency):
+        """Record a finished response of a class"""
+        with self._lock:
+            stats = self._stats(name)
+            stats.output_tokens.append(output_tokens)
+            stats.latencies(mode).append(latency)
+            stats.failures.append(stop_reason == "max_tokens")
+            stats.truncated += stop_reason == "max_tokens"
+
+    def record_timeout(self, name):
+        """Record a request of a class that hit its timeout"""
+        with self._lock:
+            stats = self._stats(name)
+            stats.failures.append(True)
+            stats.timeouts += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    "samples": len(stats.output_tokens),
+                    "truncated": stats.truncated,
+                    "timeouts": stats.timeouts,
+                    "p50_output_tokens": _percentile(stats.output_tokens, 50) if stats.output_tokens else None,
+                    "max_output_tokens": max(stats.output_tokens, default=None)
+                }
+                for name, stats in self.classes.items()
+            }